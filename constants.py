@@ -4,6 +4,37 @@ GRID_SIZE = 20  # Size of the grid in cells. Square grid.
 GRID_DISPLAY_SIZE = 600  # Size of grid in pixels.
 UI_HEIGHT = 100  # Height of UI panel
 FPS = 30
+# On grids at least this big, long searches go through hierarchical
+# pathfinding with clusters this many tiles across.
+HIERARCHY_MIN_GRID_SIZE = 64
+HIERARCHY_CLUSTER_SIZE = 16
+# Seconds per frame the hider may spend thinking before it picks back up
+# next frame, so big maps don't freeze the game.
+HIDER_THINK_BUDGET = 0.01
+# Seconds for the seeker's stench trail to fade to half strength.
+STENCH_HALF_LIFE = 2.0
+# Have the seeker keep odds of where the hider is instead of just
+# exploring the tiles it hasn't seen in a while (see belief_map.py).
+SEEKER_BELIEF_MAP = False
+# When exploring, how much closer tiles count for over older ones: a tile
+# one step further away has to have gone unseen this many thinks longer to
+# be picked. 0 just goes for the oldest tile.
+SEEKER_EXPLORE_DISTANCE_WEIGHT = 0.0
+# Threads for the NPCs to think on at the same time (see think_pool.py).
+# 1 means they take turns on the main thread.
+THINK_THREADS = 1
+# Processes to run simulation rounds on (see round_runner.py). None means
+# one per CPU core, 1 runs them one by one in the app's own process.
+SIM_WORKERS = None
+# Simulation rounds played together at a time, sharing what they work out
+# about the level (see batch_runner.py), with the NPCs of every game moved
+# together as arrays. 1 plays them one at a time.
+SIM_BATCH_SIZE = 25
+# Have simulation rounds jump straight to the next step where something
+# happens instead of playing out every step (see SimulationManager). Works
+# with SIM_BATCH_SIZE too: the games in a batch take turns, each jumping
+# ahead on its own, so they don't stay on the same step number.
+SIM_EVENT_DRIVEN = False
 
 BACKGROUND_COLOR = (10, 10, 30)
 GRID_LINE_COLOR = (50, 50, 100)
@@ -1,14 +1,19 @@
-from typing import Dict
-import pygame
-
-import heapq as hq
+import time
+from array import array
+from collections import OrderedDict, deque
+from typing import Optional
 
 from math import inf
 from core.npc import Npc
 from models.grid_node import GridNode
-from collections import deque
+from models.grid_storage import HAS_NUMPY, SEEN_BY_SEEKER, np
 
 class Hider(Npc):
+    # How many past analyses think() remembers.
+    THINK_CACHE_SIZE = 32
+    # If thinking is spread over frames (see think_budget), give up on the
+    # rest of the analysis after this many seconds and go with what's done.
+    THINK_DEADLINE = 0.4
 
     def __init__(self, *args, characteristics=None, **kwargs):
         super().__init__(*args, **kwargs)
@@ -24,152 +29,120 @@ class Hider(Npc):
         self.auto_move = True
         # this is an instance variable so we can see it 
         # drawn to the screen in think_draw()
-        self.possible_locations: dict[GridNode, float] = {}
-        self.wall_distances: dict[GridNode, float] = {}
-        self.shadow_distances: dict[GridNode, float] = {}
-        self.dist_to_me: dict[GridNode, float] = {}
-        self.blind_spot_shadow_size: dict[GridNode, float] = {}
+        # Each of these is a "layer": a flat list with one value per tile,
+        # indexed like the grid (y * size + x). -inf means the tile isn't
+        # a place to hide.
+        self.possible_locations: list[float] = []
+        self.wall_distances: list[float] = []
+        self.shadow_distances: list[float] = []
+        self.dist_to_me: list[float] = []
+        self.blind_spot_shadow_size: list[float] = []
         self.debug_nodes: list[GridNode] = []
         self.debug_text: list[str] = []
         self.best_location = None
+        # The result of think()'s analysis for recent world states, see
+        # analysis_key(). The seeker standing still (like while it's frozen
+        # at the start of a round) means asking the same question again.
+        self.think_cache: OrderedDict = OrderedDict()
+        self.think_cache_hits = 0 # just metrics
+        self.think_cache_misses = 0
+        # Seconds of analysis to do per frame. None means think() does the
+        # whole analysis right away. Otherwise it's split into stages that
+        # update() works through a bit at a time, so a big map doesn't freeze
+        # the game, and best_location stays what it was until it's done.
+        # Each stage is a resumable job (see resumable.py) that stops every
+        # row or thousand tiles or so, so the stages don't go much over the
+        # budget. Scoring at the end and the path to the new spot still
+        # happen in one go (about 10-25 ms on a 160x160 map).
+        self.think_budget: Optional[float] = None
+        self.analyzing = False # until finish_analysis()
+        self.pending_stages = deque()
+        self.analysis_key_pending = None
+        self.analysis_deadline = 0.0
+        # What the world looked like when the analysis started. The seeker
+        # can move and the stench can change while it's being worked on,
+        # and the stages and caches all have to go by the same picture.
+        self.analysis_seen = b"" # seen_by_seeker as bytes
+        self.analysis_view_key = None # view_key()
+        self.analysis_stench = array('d')
     
     def reset_mind(self) -> None:
-        self.possible_locations: dict[GridNode, float] = {}
-        self.wall_distances: dict[GridNode, float] = {}
-        self.shadow_distances: dict[GridNode, float] = {}
-        self.dist_to_me: dict[GridNode, float] = {}
-        self.blind_spot_shadow_size: dict[GridNode, float] = {}
+        self.possible_locations: list[float] = []
+        self.wall_distances: list[float] = []
+        self.shadow_distances: list[float] = []
+        self.dist_to_me: list[float] = []
+        self.blind_spot_shadow_size: list[float] = []
         self.debug_nodes: list[GridNode] = []
         self.debug_text: list[str] = []
 
-    def create_possible_locations(self) -> None:
-        for node in self.grid.all_nodes():
-            if not node.seen_by_seeker and not node.is_wall:
-                self.possible_locations[node] = 0
-            else:
-                self.possible_locations[node] = -inf
+    # Shows a layer's values on the tiles (see draw()), skipping -inf.
+    def debug_layer(self, layer: list[float], digits: int = None) -> None:
+        for i, value in enumerate(layer):
+            if value == -inf: continue
+            self.debug_nodes.append(self.grid.node_at(i))
+            self.debug_text.append(str(value if digits is None else round(value, digits)))
 
-    def create_wall_distances(self) -> None:
-        # Get all the unseen spots that are closest to a wall
-        starting_points: set[GridNode] = set()
-        for node in self.grid.all_nodes():
-            if self.possible_locations[node] != 0: continue
-            if any(
-                [n.is_wall for n in self.grid.get_neighbors(node, wall_ok=True)]
-            ):
-                starting_points.add(node)
-        # Default values
-        for node, v in self.possible_locations.items():
-            self.wall_distances[node] = inf if v == 0 else -inf
-        # BFS out from all the points, keeping track of the min dist to a wall, to store which nodes are closest to walls
-        q = deque()
-        seen = set()
-        for node in starting_points:
-            q.append((node, 0))
-        while q:
-            node, dist = q.popleft()
-            if node in seen:
-                continue
-            seen.add(node)
-            self.wall_distances[node] = min(self.wall_distances[node], dist)
-            for n in self.grid.get_neighbors(node, wall_ok=False):
-                if self.possible_locations[n] == 0 and n not in seen:
-                    q.append((n, dist + 1))
+    # The create_*() stages are resumable jobs, see start_analysis().
+    def create_possible_locations(self):
+        seen = self.analysis_seen
+        walls = self.grid.wall_bytes()
+        self.possible_locations = [
+            0 if not s and not w else -inf for s, w in zip(seen, walls)
+        ]
+        yield
+
+    def create_wall_distances(self):
+        grid = self.grid
+        possible = bytes(v == 0 for v in self.possible_locations)
+        # The unseen spots right next to a wall are 0, and everything else
+        # counts steps from there without leaving the unseen spots.
+        starting_points = yield from grid.touching_steps(grid.wall_bytes())
+        dists = yield from grid.distance_transform_steps(starting_points, within=possible)
+        self.wall_distances = [d if p else -inf for d, p in zip(dists, possible)]
         # Debug purposes (comment or remove the return to see the wall scoring)
         return
-        for node, dist in self.wall_distances.items():
-            if dist == -inf: continue
-            self.debug_nodes.append(node)
-            self.debug_text.append(str(dist))
+        self.debug_layer(self.wall_distances)
     
-    def create_shadow_distances(self) -> None:
-        # Get all the unseen spots that are closest to a wall
-        starting_points: set[GridNode] = set()
-        for node in self.grid.all_nodes():
-            if self.possible_locations[node] != 0: continue
-            if any(
-                [not n.is_wall and n.seen_by_seeker for n in self.grid.get_neighbors(node, wall_ok=True)]
-            ):
-                starting_points.add(node)
-        # Default values
-        for node, v in self.possible_locations.items():
-            self.shadow_distances[node] = inf if v == 0 else -inf
-        # BFS out from all the points, keeping track of the minimum distance to the starting points (shadow edges)
-        q = deque()
-        seen = set()
-        for node in starting_points:
-            q.append((node, 0))
-        while q:
-            node, dist = q.popleft()
-            if node in seen:
-                continue
-            seen.add(node)
-            self.shadow_distances[node] = min(self.shadow_distances[node], dist)
-            for n in self.grid.get_neighbors(node, wall_ok=False):
-                if self.possible_locations[n] == 0 and n not in seen:
-                    q.append((n, dist + 1))
-        for node, dist in self.shadow_distances.items():
-            # Dist == inf means that the node is not reachable, so make it -inf
-            # to indicate that it is not a possible location
-            if dist == inf: self.shadow_distances[node] = -inf
+    def create_shadow_distances(self):
+        grid = self.grid
+        possible = bytes(v == 0 for v in self.possible_locations)
+        # The unseen spots right next to a seen one (the edge of the
+        # seeker's view) are 0, then the same as create_wall_distances().
+        walls = grid.wall_bytes()
+        seen_open = bytes(
+            s and not w for s, w in zip(self.analysis_seen, walls)
+        )
+        starting_points = yield from grid.touching_steps(seen_open)
+        dists = yield from grid.distance_transform_steps(starting_points, within=possible)
+        # Dist == inf means that the node is not reachable, so make it -inf
+        # to indicate that it is not a possible location
+        self.shadow_distances = [d if p and d != inf else -inf for d, p in zip(dists, possible)]
         # Debug purposes (comment or remove the return to see the shadow scoring)
         return
-        for node, dist in self.shadow_distances.items():
-            if dist == -inf: continue
-            self.debug_nodes.append(node)
-            self.debug_text.append(str(dist))
+        self.debug_layer(self.shadow_distances)
 
-    def create_dist_to_me(self, pos) -> None:
-        # Dijkstra out from the seeker to find dists to all nodes
-        pq = []
-        dists = {}
-        for node in self.grid.all_nodes():
-            dists[node] = inf
-        dists[pos] = 0
-        hq.heappush(pq, (0, pos))
-        while pq:
-            dist, node = hq.heappop(pq)
-            if dists[node] < dist:
-                continue
-            for n in self.grid.get_neighbors(node, wall_ok=False):
-                if dists[n] > dist + 1:
-                    dists[n] = dist + 1
-                    hq.heappush(pq, (dists[n], n))
-        for node, v in self.possible_locations.items():
-            if v == 0 and self.shadow_distances[node] != -inf:
-                self.dist_to_me[node] = dists[node]
-            else:
-                self.dist_to_me[node] = -inf
+    def create_dist_to_me(self, pos):
+        # Distance from me to every node (shared with anyone else asking,
+        # the same as grid.distances.from_tile())
+        dists = yield from self.grid.distances.field_steps((pos.y * self.grid.size + pos.x,))
+        # (shadow distances are only there for possible locations)
+        self.dist_to_me = [
+            d if shadow != -inf else -inf for d, shadow in zip(dists.dist, self.shadow_distances)
+        ]
         # Debug purposes (comment or remove the return to see the dist scoring)
         return
-        for node, dist in self.dist_to_me.items():
-            if dist == -inf: continue
-            self.debug_nodes.append(node)
-            self.debug_text.append(str(dist))
+        self.debug_layer(self.dist_to_me)
 
-    def create_blind_spot_shadow_size(self) -> None:
-        seen = {k:(v==-inf) for k,v in self.dist_to_me.items()}
-        for node in self.grid.all_nodes():
-            if seen[node]: continue
-            q = deque()
-            q.append(node)
-            tempseen = set()
-            while q:
-                curr = q.popleft()
-                if curr in tempseen: continue
-                tempseen.add(curr)
-                for n in self.grid.get_neighbors(curr, wall_ok=False):
-                    if seen[n]: continue
-                    q.append(n)
-            for n in tempseen:
-                seen[n] = True
-                self.blind_spot_shadow_size[n] = len(tempseen)
+    def create_blind_spot_shadow_size(self):
+        # Each group of hiding spots you can walk around in without being
+        # seen, and how many tiles are in it.
+        # (the same tiles dist_to_me has, but this way it only depends on the view)
+        hidden = bytes(v != -inf for v in self.shadow_distances)
+        labels, sizes = yield from self.grid.label_components_steps(hidden)
+        self.blind_spot_shadow_size = [sizes[label] if label != -1 else -inf for label in labels]
         # Debug purposes (comment or remove the return to see the size scoring)
         return
-        for node, dist in self.blind_spot_shadow_size.items():
-            if dist == -inf: continue
-            self.debug_nodes.append(node)
-            self.debug_text.append(str(dist))
+        self.debug_layer(self.blind_spot_shadow_size)
 
     @staticmethod
     def score_with_range(value: float, min_value: float, max_value: float) -> float:
@@ -181,70 +154,93 @@ class Hider(Npc):
     def invert_in_range(value: float, min_value: float, max_value: float) -> float:
         return max_value - (value - min_value)
 
-    def determine_best_location(self) -> GridNode:
+    # Scores every possible location and returns the best one, or None.
+    # Each category is scaled to 0..1 over its range, weighted and summed.
+    # With NumPy this runs over whole layers at once; otherwise it loops
+    # over the possible locations.
+    # `stench`: the strengths to go by, the grid's current ones if not given.
+    def determine_best_location(self, stench=None) -> GridNode:
         # Multiplier applied to each category for scoring
         weights = self.characteristics
+        if stench is None:
+            stench = self.grid.stench.strength # 0 to 1, the trail counts for less
+        if HAS_NUMPY:
+            best = self._score_layers_numpy(weights, stench)
+        else:
+            best = self._score_layers(weights, stench)
+        if best == -1:
+            return None
+        return self.grid.node_at(best)
 
-        possibilities: dict[GridNode, float] = {k:0 for k,v in self.shadow_distances.items() if v != -inf}
+    # Returns the index of the best location, or -1 if there isn't one.
+    def _score_layers(self, weights, stench) -> int:
+        score, invert = self.score_with_range, self.invert_in_range
+        possibilities = [i for i, v in enumerate(self.shadow_distances) if v != -inf]
+        if not possibilities: return -1
+        scores = [0] * len(possibilities)
+        # Distance to walls, distance to shadows, distance to hider, size
+        # of blind spot. Walls and hider are closer = better.
+        for layer, weight, inverted in (
+            (self.wall_distances, weights["distance to walls"], True),
+            (self.shadow_distances, weights["distance to shadows"], False),
+            (self.dist_to_me, weights["distance to hider"], True),
+            (self.blind_spot_shadow_size, weights["size of blind spot"], False),
+        ):
+            furthest_dist = max(layer or [0])
+            closest_dist = 0
+            for k, i in enumerate(possibilities):
+                value = invert(layer[i], closest_dist, furthest_dist) if inverted else layer[i]
+                scores[k] += score(value, closest_dist, furthest_dist) * weight * 10
+        for k, i in enumerate(possibilities):
+            scores[k] += -weights["stench"] * 10 * stench[i]
+        return possibilities[max(range(len(scores)), key=scores.__getitem__)]
 
-        if not possibilities.keys(): return None
+    # Same as _score_layers(), but as array operations. Gives exactly the
+    # same answer, including when a category's range is infinite (then that
+    # category is NaN for everyone, and max() would pick the first spot).
+    def _score_layers_numpy(self, weights, stench) -> int:
+        shadow = np.asarray(self.shadow_distances, dtype=np.float64)
+        possibilities = np.flatnonzero(shadow != -inf)
+        if possibilities.size == 0: return -1
+        scores = np.zeros(possibilities.size)
+        with np.errstate(invalid="ignore"): # inf - inf and inf / inf are NaN on purpose
+            for layer, weight, inverted in (
+                (self.wall_distances, weights["distance to walls"], True),
+                (shadow, weights["distance to shadows"], False),
+                (self.dist_to_me, weights["distance to hider"], True),
+                (self.blind_spot_shadow_size, weights["size of blind spot"], False),
+            ):
+                layer = np.asarray(layer, dtype=np.float64)
+                furthest_dist = layer.max() if layer.size else 0
+                closest_dist = 0
+                values = layer[possibilities]
+                if inverted:
+                    values = furthest_dist - (values - closest_dist)
+                if furthest_dist - closest_dist != 0:
+                    scores += (values - closest_dist) / (furthest_dist - closest_dist) * weight * 10
+        scores += -weights["stench"] * 10 * np.frombuffer(stench, dtype=np.float64)[possibilities]
+        # max() keeps the first of any ties, skips NaNs after the first
+        # element, and sticks with the first element if that's NaN.
+        if np.isnan(scores[0]):
+            return int(possibilities[0])
+        return int(possibilities[np.argmax(np.where(np.isnan(scores), -inf, scores))])
 
-        # Distance to walls calculation
-        furthest_dist = max(self.wall_distances.values() or [0])
-        closest_dist = 0
-        for node in possibilities.keys():
-            possibilities[node] += self.score_with_range(
-                self.invert_in_range(
-                    self.wall_distances[node],
-                    closest_dist,
-                    furthest_dist
-                ),
-                closest_dist,
-                furthest_dist
-            ) * weights["distance to walls"] * 10
-        # Distance to shadows calculation
-        furthest_dist = max(self.shadow_distances.values() or [0])
-        closest_dist = 0
-        for node in possibilities.keys():
-            possibilities[node] += self.score_with_range(
-                self.shadow_distances[node],
-                closest_dist,
-                furthest_dist
-            ) * weights["distance to shadows"] * 10
-        # Distance to hider calculation
-        furthest_dist = max(self.dist_to_me.values() or [0])
-        closest_dist = 0
-        for node in possibilities.keys():
-            possibilities[node] += self.score_with_range(
-                self.invert_in_range(
-                    self.dist_to_me[node],
-                    closest_dist,
-                    furthest_dist
-                ),
-                closest_dist,
-                furthest_dist
-            ) * weights["distance to hider"] * 10
-        # Size of blind spot calculation
-        furthest_dist = max(self.blind_spot_shadow_size.values() or [0])
-        closest_dist = 0
-        for node in possibilities.keys():
-            possibilities[node] += self.score_with_range(
-                self.blind_spot_shadow_size[node],
-                closest_dist,
-                furthest_dist
-            ) * weights["size of blind spot"] * 10
-        for node in possibilities.keys():
-            possibilities[node] += (-weights["stench"] * 10) if node.stench else 0
-        return max(possibilities, key=possibilities.get)
-        # Debug purposes (comment or remove the return to see the final scoring)
-        for node, dist in possibilities.items():
-            if dist == -inf: continue
-            self.debug_nodes.append(node)
-            self.debug_text.append(str(round(dist, 2)))
+    # Everything the analysis in think() depends on: what the seeker can
+    # see (and from where), where I am, the walls, the stench, and my
+    # characteristics.
+    def analysis_key(self, location: GridNode) -> tuple:
+        grid = self.grid
+        return (
+            grid.seeker_view, location.index, grid.wall_version, grid.stench_version,
+            tuple(sorted(self.characteristics.items()))
+        )
 
     def think(self):
+        if self.analyzing:
+            self.finish_analysis() # out of time, go with what's there
         self.reset_mind()
-        self.extra_costs = self.make_extra_costs()
+        # Steer around the seeker's stench (the grid keeps the layer up to date)
+        self.cost_weights = {"stench": self.characteristics["stench_cost"]}
 
         location = self.grid.get_node(*self.position.to_grid_pos())
         
@@ -254,55 +250,138 @@ class Hider(Npc):
         else:
             self.emit_thought("uh oh")
 
-        # Consider if the seeker can see the hiding spot
-        self.create_possible_locations() # normal grid iter
-        # Consider how close the hiding spot is to a wall (closer is better)
-        self.create_wall_distances() # bfs from walls into hiding spots
-        # Consider how close the hiding spot is to the seekers fov
-        self.create_shadow_distances() # bfs from shadows into hiding spots
-        # Consider how close I am to the hiding spot
-        self.create_dist_to_me(location) # dijkstra from seeker to hiding spots
-        # Consider how much wiggle room the hiding spot has before seeker sees it
-        self.create_blind_spot_shadow_size() # bfs all hiding spot groups
+        key = self.analysis_key(location)
+        cached = self.think_cache.get(key)
+        if cached is not None:
+            # Nothing changed since last time, so neither has the answer
+            self.think_cache_hits += 1
+            self.think_cache.move_to_end(key)
+            (self.possible_locations, self.wall_distances, self.shadow_distances,
+             self.dist_to_me, self.blind_spot_shadow_size, self.best_location) = cached
+            self.go_to_best_location()
+            return
+        self.think_cache_misses += 1
+        self.start_analysis(location, key)
+        if self.think_budget is None:
+            self.work_on_analysis(None)
+
+    # What the layers that only depend on the seeker's view are kept under
+    # in grid.views (the walls are in seeker_view too, but only as of the
+    # last update_visibility()).
+    def view_key(self) -> tuple:
+        return ("hider layers", self.grid.seeker_view, self.grid.wall_version)
 
-        self.best_location = self.determine_best_location()
-        if self.best_location not in self.shadow_distances:
-            self.emit_thought("I can't go anywhere :(")
-            self.set_target(*self.position.to_grid_pos())
+    # Queues up the stages that work out the best place to hide from
+    # `location`, along with all the layers that go into it.
+    # The shadow distances and distance to me come first since those say
+    # where it's possible to hide at all; the rest only fine-tune it.
+    # Every layer but the distance to me only depends on what the seeker
+    # can see, so those come from grid.views if anyone has worked them out
+    # for this view already.
+    # `key` is analysis_key(), taken right before this, so it goes with the
+    # view and stench snapshotted here.
+    def start_analysis(self, location: GridNode, key: tuple) -> None:
+        grid = self.grid
+        self.analyzing = True
+        self.analysis_key_pending = key
+        self.analysis_deadline = time.perf_counter() + self.THINK_DEADLINE
+        self.analysis_seen = grid.storage.mask_bytes(SEEN_BY_SEEKER)
+        self.analysis_view_key = self.view_key()
+        self.analysis_stench = array('d', grid.stench.strength)
+        layers = grid.views.recall(self.analysis_view_key) if grid.seeker_view else None
+        if layers is not None:
+            (self.possible_locations, self.wall_distances, self.shadow_distances,
+             self.blind_spot_shadow_size) = layers
+            self.pending_stages = deque([self.create_dist_to_me(location)])
             return
+        self.pending_stages = deque([
+            # Consider if the seeker can see the hiding spot
+            self.create_possible_locations(), # normal grid iter
+            # Consider how close the hiding spot is to the seekers fov
+            self.create_shadow_distances(), # distance transform from shadow edges
+            # Consider how close I am to the hiding spot
+            self.create_dist_to_me(location), # distance field from me to hiding spots
+            # Consider how close the hiding spot is to a wall (closer is better)
+            self.create_wall_distances(), # distance transform from walls
+            # Consider how much wiggle room the hiding spot has before seeker sees it
+            self.create_blind_spot_shadow_size(), # label the hiding spot groups
+        ])
+
+    # Works on the analysis for up to `budget` seconds (or all of it if
+    # None), checking the time whenever a stage stops for a moment.
+    # Finishes up when the stages are all done or the deadline has passed.
+    # Scoring the spots at the end happens all at once, so if the stages
+    # use up the budget, that waits for the next frame.
+    def work_on_analysis(self, budget: Optional[float]) -> None:
+        stop_at = None if budget is None else time.perf_counter() + budget
+        while self.pending_stages:
+            try:
+                next(self.pending_stages[0])
+            except StopIteration:
+                self.pending_stages.popleft() # that layer's done
+            if stop_at is None:
+                continue
+            now = time.perf_counter()
+            if now >= self.analysis_deadline:
+                break
+            if now >= stop_at:
+                return # pick it back up next frame
+        self.finish_analysis()
+
+    # Scores the locations with whatever layers are done. Layers that didn't
+    # get made count as 0 for every spot. If it didn't even get as far as
+    # knowing where it's possible to hide, the old best_location stays.
+    def finish_analysis(self) -> None:
+        # If the walls changed partway through, the layers are a mix of both
+        complete = not self.pending_stages and self.analysis_view_key[2] == self.grid.wall_version
+        self.analyzing = False
+        self.pending_stages = deque()
+        candidates = [v == 0 for v in self.possible_locations]
+        if not candidates or len(self.shadow_distances) != len(candidates):
+            return
+        flat = [0 if shadow != -inf else -inf for shadow in self.shadow_distances]
+        if len(self.dist_to_me) != len(candidates):
+            self.dist_to_me = flat
+        if len(self.wall_distances) != len(candidates):
+            self.wall_distances = flat
+        if len(self.blind_spot_shadow_size) != len(candidates):
+            self.blind_spot_shadow_size = flat
+
+        self.best_location = self.determine_best_location(self.analysis_stench)
+        if complete: # a partial answer isn't worth remembering
+            self.think_cache[self.analysis_key_pending] = (
+                self.possible_locations, self.wall_distances, self.shadow_distances,
+                self.dist_to_me, self.blind_spot_shadow_size, self.best_location
+            )
+            if len(self.think_cache) > self.THINK_CACHE_SIZE:
+                self.think_cache.popitem(last=False)
+            if self.analysis_view_key[1]: # there was a view
+                self.grid.views.remember(self.analysis_view_key, (
+                    self.possible_locations, self.wall_distances, self.shadow_distances,
+                    self.blind_spot_shadow_size
+                ))
+        self.go_to_best_location()
+
+    def go_to_best_location(self) -> None:
         if self.best_location is None:
             self.emit_thought("I can't go anywhere :(")
+            self.set_target(*self.position.to_grid_pos())
             return
         self.set_target(*self.best_location.get_position())
-    
-    def draw(self, surface: pygame.Surface, debug: bool):
-        if debug:
-            font = pygame.font.Font(None, 15)
-            text_color = (0, 0, 0)
-            if not self.debug_text or not len(self.debug_text) == len(self.debug_nodes):
-                self.debug_text = [""] * len(self.debug_nodes)
-            for node, text in zip(self.debug_nodes, self.debug_text):
-                nodepos = node.get_position()
-                screenpos = self.grid.grid_to_screen(nodepos[0] + 0.5, nodepos[1] + 0.5)
-                rectsize = 16
-                rect = pygame.Rect(
-                    screenpos[0] - rectsize // 2,
-                    screenpos[1] - rectsize // 2,
-                    rectsize,
-                    rectsize
-                )
-                pygame.draw.rect(surface, (255, 255, 255), rect)
-                text_surface = font.render(text, True, text_color)
-                text_rect = text_surface.get_rect(center=rect.center)
-                surface.blit(text_surface, text_rect)
-        super().draw(surface, debug)
-    
-    # For additional weights for the A* pathfinding.
-    def make_extra_costs(self) -> Dict[GridNode, float]:
-        extra_costs: Dict[GridNode, float] = {}
-        all = self.grid.all_nodes()
-        stench_cost = self.characteristics["stench_cost"]
-        for n in all:
-            if n.stench:
-                extra_costs[n] = stench_cost
-        return extra_costs
+
+    def reset(self):
+        super().reset()
+        self.analyzing = False # that was for where I used to be
+        self.pending_stages = deque()
+
+    # Working through an analysis a bit every frame counts as something
+    # happening.
+    def quiet_steps(self, dt: float) -> int:
+        if self.analyzing:
+            return 0
+        return super().quiet_steps(dt)
+
+    def update(self, dt: float):
+        if self.analyzing:
+            self.work_on_analysis(self.think_budget)
+        super().update(dt)
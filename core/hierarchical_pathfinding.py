@@ -0,0 +1,263 @@
+# Hierarchical pathfinding (HPA*, Botea, Müller & Schaeffer, 2004).
+#
+# On a big map, A* spends most of its time crawling across open space one
+# tile at a time. HPA* chops the grid into square clusters and works out
+# ahead of time where you can cross from one cluster into the next (the
+# "transitions") and how far apart the transitions inside each cluster are.
+# A long search then only has to hop between transitions, and the hops get
+# filled back in with tiny searches that never leave a single cluster.
+#
+# Paths come out close to the shortest, but not always exactly the shortest.
+# Movement rules are the same as Grid.get_neighbors() and every step costs
+# 1, so only use this when there are no extra costs.
+#
+# The clusters are rebuilt lazily: when the walls change, only the clusters
+# (and their direct neighbors) with a changed tile get redone.
+import heapq
+import threading
+from collections import deque
+from typing import Dict, List, Optional, Set, Tuple
+
+from models.grid import Grid
+
+class HierarchicalMap:
+    # An entrance (a run of open tiles along a cluster border) this long or
+    # longer gets a transition at each end instead of one in the middle.
+    LONG_ENTRANCE = 6
+
+    def __init__(self, grid: Grid, cluster_size: int = 16):
+        self.grid = grid
+        self.cluster_size = cluster_size
+        self.clusters_across = -(-grid.size // cluster_size) # rounded up
+        count = self.clusters_across * self.clusters_across
+        # (cluster a, cluster b) with a < b -> list of (tile in a, tile in b)
+        # transition pairs along the border between them.
+        self.borders: Dict[Tuple[int, int], List[Tuple[int, int]]] = {}
+        # Per cluster: transition tile -> tiles in other clusters one step away.
+        self.cross: List[Dict[int, List[int]]] = [{} for _ in range(count)]
+        # Per cluster: transition tile -> {other transition tile: distance},
+        # staying inside the cluster.
+        self.intra: List[Dict[int, Dict[int, int]]] = [{} for _ in range(count)]
+        self.walls: Optional[bytes] = None # the wall layout it was built for
+        self.wall_version = -1
+        self.clusters_rebuilt = 0 # just a metric
+        # NPCs on different threads might both notice the walls changed.
+        self.lock = threading.Lock()
+
+    # Which cluster a tile (by flat index) is in.
+    def cluster_of(self, index: int) -> int:
+        size = self.grid.size
+        c = self.cluster_size
+        return (index // size // c) * self.clusters_across + (index % size) // c
+
+    # The tile rectangle of a cluster as (x0, y0, x1, y1), end exclusive.
+    def bounds(self, cluster: int) -> Tuple[int, int, int, int]:
+        c = self.cluster_size
+        size = self.grid.size
+        x0 = cluster % self.clusters_across * c
+        y0 = cluster // self.clusters_across * c
+        return x0, y0, min(x0 + c, size), min(y0 + c, size)
+
+    # The clusters directly left, right, above and below.
+    def neighbor_clusters(self, cluster: int) -> List[int]:
+        across = self.clusters_across
+        cx, cy = cluster % across, cluster // across
+        neighbors = []
+        if cx > 0:
+            neighbors.append(cluster - 1)
+        if cx + 1 < across:
+            neighbors.append(cluster + 1)
+        if cy > 0:
+            neighbors.append(cluster - across)
+        if cy + 1 < across:
+            neighbors.append(cluster + across)
+        return neighbors
+
+    # Brings the clusters up to date with the grid's walls.
+    def update(self) -> None:
+        grid = self.grid
+        if self.wall_version == grid.wall_version:
+            return
+        with self.lock:
+            version = grid.wall_version
+            if self.wall_version == version:
+                return # someone else just did it
+            walls = grid.wall_bytes()
+            if self.walls is None:
+                dirty = set(range(len(self.intra)))
+            else:
+                dirty = {self.cluster_of(i) for i in grid.changed_walls(self.walls)}
+            self.walls = walls
+            if dirty:
+                self._rebuild(dirty)
+            # Only once it's all rebuilt, so nobody uses half of it
+            self.wall_version = version
+
+    def _rebuild(self, dirty: Set[int]) -> None:
+        # The transitions on a cluster's borders also belong to its
+        # neighbors, so those need redoing too.
+        affected = set(dirty)
+        borders = set()
+        for cluster in dirty:
+            for neighbor in self.neighbor_clusters(cluster):
+                borders.add((min(cluster, neighbor), max(cluster, neighbor)))
+                affected.add(neighbor)
+        for a, b in borders:
+            self.borders[(a, b)] = self._find_transitions(a, b)
+        for cluster in affected:
+            cross: Dict[int, List[int]] = {}
+            for neighbor in self.neighbor_clusters(cluster):
+                pairs = self.borders[(min(cluster, neighbor), max(cluster, neighbor))]
+                for a, b in pairs:
+                    if cluster > neighbor:
+                        a, b = b, a
+                    cross.setdefault(a, []).append(b)
+            self.cross[cluster] = cross
+        for cluster in affected:
+            nodes = self.cross[cluster]
+            self.intra[cluster] = {
+                node: {
+                    other: dist for other, dist in self._distances(node, cluster).items()
+                    if other in nodes and other != node
+                }
+                for node in nodes
+            }
+            self.clusters_rebuilt += 1
+
+    # Finds the transitions between two neighboring clusters (a < b).
+    # Every run of tiles where both sides of the border are open is an
+    # entrance, and gets one or two transitions.
+    def _find_transitions(self, a: int, b: int) -> List[Tuple[int, int]]:
+        size = self.grid.size
+        walls = self.walls
+        x0, y0, x1, y1 = self.bounds(a)
+        if b == a + 1: # b is to the right, so the border runs down
+            pairs = [(y * size + x1 - 1, y * size + x1) for y in range(y0, y1)]
+        else: # b is below, so the border runs across
+            pairs = [((y1 - 1) * size + x, y1 * size + x) for x in range(x0, x1)]
+        transitions = []
+        run: List[Tuple[int, int]] = []
+        for pair in pairs + [None]: # None ends the last run
+            if pair is not None and not walls[pair[0]] and not walls[pair[1]]:
+                run.append(pair)
+                continue
+            if len(run) >= self.LONG_ENTRANCE:
+                transitions += [run[0], run[-1]]
+            elif run:
+                transitions.append(run[len(run) // 2])
+            run = []
+        return transitions
+
+    # Breadth-first search from a tile, without leaving the cluster. Stops
+    # early once `target` is reached, if one is given.
+    # Returns {tile: distance} and {tile: the tile before it}.
+    def _search_cluster(self, start: int, cluster: int, target: int = -1) -> Tuple[Dict[int, int], Dict[int, int]]:
+        size = self.grid.size
+        x0, y0, x1, y1 = self.bounds(cluster)
+        adjacency = self.grid.adjacency()
+        dist = {start: 0}
+        came_from = {start: -1}
+        queue = deque([start])
+        while queue:
+            current = queue.popleft()
+            d = dist[current] + 1
+            for neighbor in adjacency[current]:
+                if neighbor in dist:
+                    continue
+                x, y = neighbor % size, neighbor // size
+                if x0 <= x < x1 and y0 <= y < y1:
+                    dist[neighbor] = d
+                    came_from[neighbor] = current
+                    if neighbor == target:
+                        return dist, came_from
+                    queue.append(neighbor)
+        return dist, came_from
+
+    def _distances(self, start: int, cluster: int) -> Dict[int, int]:
+        return self._search_cluster(start, cluster)[0]
+
+    # The tiles from a to b (both included), staying inside the cluster.
+    def _local_path(self, a: int, b: int, cluster: int) -> List[int]:
+        came_from = self._search_cluster(a, cluster, b)[1]
+        path = []
+        while b != -1:
+            path.append(b)
+            b = came_from[b]
+        return path[::-1]
+
+    # Finds a path between two open tiles, given as (x, y).
+    # Returns every tile index along the way, or an empty list if there's
+    # no path. If `visited` is given, the transitions expanded are added to it.
+    def find_path(self, start: Tuple[int, int], goal: Tuple[int, int], visited: Optional[Set[int]] = None) -> List[int]:
+        self.update()
+        size = self.grid.size
+        start_index = start[1] * size + start[0]
+        goal_index = goal[1] * size + goal[0]
+        goal_x, goal_y = goal
+        start_cluster = self.cluster_of(start_index)
+        goal_cluster = self.cluster_of(goal_index)
+        # Hook the start and goal into the graph of transitions. Neither
+        # should be a wall, and steps are the same both ways between open
+        # tiles, so searching outwards from the goal gives distances *to* it.
+        from_start = self._distances(start_index, start_cluster)
+        to_goal = self._distances(goal_index, goal_cluster)
+        goal_nodes = {node: to_goal[node] for node in self.cross[goal_cluster] if node in to_goal}
+
+        g_score: Dict[int, int] = {}
+        came_from: Dict[int, int] = {}
+        open_set = []
+        pushes = 0
+        def push(node, g, parent):
+            nonlocal pushes
+            if node in g_score and g_score[node] <= g:
+                return
+            g_score[node] = g
+            came_from[node] = parent
+            x, y = node % size, node // size
+            h = max(abs(x - goal_x), abs(y - goal_y))
+            heapq.heappush(open_set, (g + h, pushes, g, node))
+            pushes += 1
+
+        if start_index == goal_index:
+            return [start_index]
+        came_from[start_index] = -1
+        if start_cluster == goal_cluster and goal_index in from_start:
+            push(goal_index, from_start[goal_index], start_index)
+        for node in self.cross[start_cluster]:
+            if node in from_start:
+                # The start might be a transition itself
+                push(node, from_start[node], start_index if node != start_index else -1)
+        while open_set:
+            _, _, g, current = heapq.heappop(open_set)
+            if g != g_score[current]:
+                continue # outdated entry
+            if current == goal_index:
+                return self._refine(came_from, current)
+            if visited is not None:
+                visited.add(current)
+            cluster = self.cluster_of(current)
+            for other, dist in self.intra[cluster].get(current, {}).items():
+                push(other, g + dist, current)
+            for other in self.cross[cluster].get(current, ()):
+                push(other, g + 1, current)
+            if current in goal_nodes:
+                push(goal_index, g + goal_nodes[current], current)
+        return []
+
+    # Turns the chain of transitions ending at `last` into every tile along
+    # the way. Hops between clusters are a single step; hops inside a cluster
+    # get filled in with a local search.
+    def _refine(self, came_from: Dict[int, int], last: int) -> List[int]:
+        nodes = []
+        while last != -1:
+            nodes.append(last)
+            last = came_from[last]
+        nodes.reverse()
+        path = [nodes[0]]
+        for a, b in zip(nodes, nodes[1:]):
+            cluster = self.cluster_of(a)
+            if cluster != self.cluster_of(b):
+                path.append(b)
+            else:
+                path += self._local_path(a, b, cluster)[1:]
+        return path
@@ -0,0 +1,85 @@
+# Incremental replanning: fix up the last path instead of searching again.
+#
+# The seeker replans a lot while hardly anything changes. Between thinks
+# it only took a few steps along its path, and when the user paints walls
+# (App.handle_tile_click() replans for every tile dragged over) most of the
+# new walls are nowhere near the path. Either way the rest of the last path
+# is still as good as a new search would find:
+# - If the start is on the last path, the part from there on is the
+#   shortest way from there too.
+# - Adding walls only ever makes paths longer, so if none of the new ones
+#   are in the way of the rest of the path, nothing shorter has opened up.
+# Anything else (a new goal, a removed wall, a wall in the way, the start
+# off the path) is a new search with the regular Pathfinder.
+#
+# This used to be D* Lite (Koenig & Likhachev, 2002), which keeps a search
+# out from the goal and repairs it. But a moved goal throws most of that
+# search away, and even a wall landing on the path took about 10x as long
+# to repair as Pathfinder's A* takes to search from scratch, with paths
+# that zigzagged more.
+from typing import List, Optional, Tuple
+
+from core.pathfinder import Pathfinder
+from models.cost_layers import CostField
+from models.grid import Grid
+from models.grid_node import GridNode
+
+class IncrementalPlanner:
+    def __init__(self, grid: Grid, fallback: Pathfinder):
+        self.grid = grid
+        self.fallback = fallback
+        self.path: List[GridNode] = []
+        self.searches = 0 # just metrics
+        self.reuses = 0
+        self.reset()
+
+    # Forgets the last path.
+    def reset(self) -> None:
+        self.answer: List[int] = [] # tile indices, like the grid
+        self.goal = -1
+        self.walls: Optional[bytes] = None # Grid.wall_bytes() when it was found
+        self.wall_version = -1
+
+    # Same as Pathfinder.find_path(), but reuses the last path when it can.
+    def find_path(self, start: Tuple[int, int], goal: Tuple[int, int], costs: Optional[CostField] = None) -> List[GridNode]:
+        grid = self.grid
+        self.path = []
+        if not grid.is_valid_position(*start) or not grid.is_valid_position(*goal):
+            return []
+        if grid.is_wall(*goal):
+            return []
+        if (costs and costs.any) or grid.is_wall(*start):
+            # Costs can change without the walls changing, so these paths
+            # aren't kept
+            self.path = self.fallback.find_path(start, goal, costs)
+            return self.path
+        size = grid.size
+        start_index = start[1] * size + start[0]
+        goal_index = goal[1] * size + goal[0]
+        if goal_index == self.goal and start_index in self.answer and self._still_clear():
+            self.reuses += 1
+            self._remember(self.answer[self.answer.index(start_index):])
+        else:
+            self.searches += 1
+            self.goal = goal_index
+            self._remember([node.y * size + node.x for node in self.fallback.find_path(start, goal)])
+        self.path = [grid.node_at(i) for i in self.answer]
+        return self.path
+
+    def _remember(self, path: List[int]) -> None:
+        self.answer = path
+        self.walls = self.grid.wall_bytes()
+        self.wall_version = self.grid.wall_version
+
+    # True if no walls were taken away since the last path was found, and
+    # every step of it can still be taken.
+    def _still_clear(self) -> bool:
+        grid = self.grid
+        if self.wall_version == grid.wall_version:
+            return True
+        walls = grid.wall_bytes()
+        if not all(walls[i] for i in grid.changed_walls(self.walls)):
+            return False
+        adjacency = grid.adjacency()
+        answer = self.answer
+        return all(answer[k + 1] in adjacency[answer[k]] for k in range(len(answer) - 1))
@@ -0,0 +1,195 @@
+# Jump Point Search (Harabor & Grastien, 2011).
+#
+# On a grid where every step costs the same, A* wastes a lot of time on
+# paths that are really the same path in a different order (right then
+# diagonal vs diagonal then right...). JPS skips over all of that: from each
+# node it only "jumps" in a straight line until something interesting
+# happens, like a wall ending (a "forced neighbor") or reaching the goal.
+# Only those jump points go into the priority queue.
+#
+# Movement rules are the same as Grid.get_neighbors(): 8 directions, every
+# step costs 1, and a diagonal step isn't allowed if both tiles beside it
+# are walls. Only use this when there are no extra costs.
+import heapq
+from typing import List, Optional, Set, Tuple
+
+from models.grid import Grid
+
+# Finds a path with JPS. `scratch` is the pathfinder's SearchScratch.
+# Returns the full list of tile indices from start to goal (every tile, not
+# just the jump points), or an empty list if there's no path.
+# If `visited`/`frontier` sets are given, the jump points expanded/queued are
+# added to them.
+def jump_point_search(grid: Grid, start: Tuple[int, int], goal: Tuple[int, int], scratch,
+                      visited: Optional[Set[int]] = None, frontier: Optional[Set[int]] = None) -> List[int]:
+    size = grid.size
+    walls = grid.wall_bytes()
+    goal_x, goal_y = goal
+    goal_index = goal_y * size + goal_x
+
+    def wall_at(x, y):
+        return 0 <= x < size and 0 <= y < size and walls[y * size + x]
+
+    # The jumps below are the hot loop, so they work on flat indices and spell
+    # out the movement rules by hand. Each returns the index of the jump
+    # point it finds, or -1 if it runs into a wall or the edge of the grid.
+    # A neighbor is "forced" when a wall beside us means the only good way to
+    # reach it is through the current tile, so the path may turn here.
+
+    def jump_horizontal(x, y, dx):
+        i = y * size + x
+        has_up = y + 1 < size
+        has_down = y > 0
+        while True:
+            x += dx
+            if not 0 <= x < size:
+                return -1
+            i += dx
+            if walls[i]:
+                return -1
+            if i == goal_index:
+                return i
+            # Diagonal steps past a wall beside us are only possible when
+            # the tile ahead is open.
+            if 0 <= x + dx < size and not walls[i + dx]:
+                if (has_up and walls[i + size] and not walls[i + size + dx]) \
+                or (has_down and walls[i - size] and not walls[i - size + dx]):
+                    return i
+
+    def jump_vertical(x, y, dy):
+        i = y * size + x
+        step = dy * size
+        has_right = x + 1 < size
+        has_left = x > 0
+        while True:
+            y += dy
+            if not 0 <= y < size:
+                return -1
+            i += step
+            if walls[i]:
+                return -1
+            if i == goal_index:
+                return i
+            if 0 <= y + dy < size and not walls[i + step]:
+                if (has_right and walls[i + 1] and not walls[i + step + 1]) \
+                or (has_left and walls[i - 1] and not walls[i + step - 1]):
+                    return i
+
+    # Also stops wherever a straight jump from here would find something,
+    # since the path has to turn there.
+    def jump_diagonal(x, y, dx, dy):
+        i = y * size + x
+        step = dy * size
+        while True:
+            if not (0 <= x + dx < size and 0 <= y + dy < size):
+                return -1
+            if walls[i + step + dx]:
+                return -1
+            if walls[i + dx] and walls[i + step]:
+                return -1 # no squeezing between two walls diagonally
+            x += dx
+            y += dy
+            i += step + dx
+            if i == goal_index:
+                return i
+            if 0 <= y + dy < size and walls[i - dx] \
+            and not walls[i + step - dx] and not walls[i + step]:
+                return i
+            if 0 <= x + dx < size and walls[i - step] \
+            and not walls[i - step + dx] and not walls[i + dx]:
+                return i
+            if jump_horizontal(x, y, dx) != -1 or jump_vertical(x, y, dy) != -1:
+                return i
+
+    # The directions worth searching from (x, y) after arriving from the parent.
+    def directions(x, y, parent):
+        if parent == -1: # the start node, try everything
+            return [(dx, dy) for dx in (-1, 0, 1) for dy in (-1, 0, 1) if dx or dy]
+        px, py = parent % size, parent // size
+        dx = (x > px) - (x < px)
+        dy = (y > py) - (y < py)
+        if dx and dy:
+            dirs = [(dx, 0), (0, dy), (dx, dy)]
+            if wall_at(x - dx, y):
+                dirs.append((-dx, dy))
+            if wall_at(x, y - dy):
+                dirs.append((dx, -dy))
+        elif dx:
+            dirs = [(dx, 0)]
+            if wall_at(x, y + 1):
+                dirs.append((dx, 1))
+            if wall_at(x, y - 1):
+                dirs.append((dx, -1))
+        else:
+            dirs = [(0, dy)]
+            if wall_at(x + 1, y):
+                dirs.append((1, dy))
+            if wall_at(x - 1, y):
+                dirs.append((-1, dy))
+        return dirs
+
+    start_x, start_y = start
+    start_index = start_y * size + start_x
+    generation = scratch.begin(size * size)
+    g_score = scratch.g_score
+    came_from = scratch.came_from
+    stamp = scratch.stamp
+    g_score[start_index] = 0
+    came_from[start_index] = -1
+    stamp[start_index] = generation
+    # Every step costs 1, so the distance is the number of steps along the
+    # longer axis.
+    h = max(abs(start_x - goal_x), abs(start_y - goal_y))
+    open_set = [(h, 0, 0, start_index)]
+    pushes = 1
+    while open_set:
+        _, _, g, current = heapq.heappop(open_set)
+        if g != g_score[current]:
+            continue # outdated entry
+        if visited is not None:
+            visited.add(current)
+        if current == goal_index:
+            return _expand(came_from, current, size)
+        x, y = current % size, current // size
+        for dx, dy in directions(x, y, came_from[current]):
+            if dx and dy:
+                jump = jump_diagonal(x, y, dx, dy)
+            elif dx:
+                jump = jump_horizontal(x, y, dx)
+            else:
+                jump = jump_vertical(x, y, dy)
+            if jump == -1:
+                continue
+            jx, jy = jump % size, jump // size
+            m_g_score = g + max(abs(jx - x), abs(jy - y))
+            if stamp[jump] != generation or m_g_score < g_score[jump]:
+                stamp[jump] = generation
+                came_from[jump] = current
+                g_score[jump] = m_g_score
+                h = max(abs(jx - goal_x), abs(jy - goal_y))
+                heapq.heappush(open_set, (m_g_score + h, pushes, m_g_score, jump))
+                pushes += 1
+                if frontier is not None:
+                    frontier.add(jump)
+    return []
+
+# Turns the chain of jump points ending at `last` into every tile along
+# the way. Jumps are always straight or perfectly diagonal, so it's just a
+# matter of stepping from one to the next.
+def _expand(came_from: List[int], last: int, size: int) -> List[int]:
+    jump_points = []
+    while last != -1:
+        jump_points.append(last)
+        last = came_from[last]
+    jump_points.reverse()
+    path = [jump_points[0]]
+    for a, b in zip(jump_points, jump_points[1:]):
+        x, y = a % size, a // size
+        bx, by = b % size, b // size
+        dx = (bx > x) - (bx < x)
+        dy = (by > y) - (by < y)
+        while (x, y) != (bx, by):
+            x += dx
+            y += dy
+            path.append(y * size + x)
+    return path
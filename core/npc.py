@@ -1,20 +1,29 @@
-from typing import Dict
-import pygame
+import math
+from typing import Dict, Tuple
 from core.pathfinder import Pathfinder
+from models.game_clock import steps_under
 from models.grid import Grid
 from models.grid_node import GridNode
 from models.vector import Vector2
 from constants import *
-import random
 
 # This NPC lives on a grid and pursues the target via its pathfinder.
 class Npc:
     THINK_INTERVAL = 0.5 # This npc will think every X seconds
     THOUGHT_DURATION = 0.5 # how long does thought-text appear for? (in sec)
 
-    def __init__(self, grid: Grid, pathfinder: Pathfinder, color: pygame.Color, can_think: bool):
+    def __init__(self, grid: Grid, pathfinder: Pathfinder, color: Tuple[int, int, int], can_think: bool):
         self.grid = grid
-        self.pathfinder = pathfinder
+        # Game time (see game_clock.py). The game loop moves it, not the NPC.
+        self.clock = grid.clock
+        # And the grid's random numbers, so a seeded round plays out the same
+        self.random = grid.random
+        # Its own copy, so its searches don't get mixed up with other NPCs'
+        self.pathfinder = pathfinder.for_agent()
+        # If set, update_path() asks this instead of the pathfinder. It has
+        # the same find_path() but remembers its last path (see
+        # incremental_planner.py), so it has to belong to just this NPC.
+        self.planner = None
         # Position is in world coords. like cell coords, but float.
         self.position = Vector2(grid.size // 2, grid.size // 2)
         self.target = None
@@ -24,18 +33,23 @@ class Npc:
         self.color = color
         self.can_think = can_think
         self.think_timer = 0
+        # If true, something else (a ThinkPool) calls think_due() and
+        # think() for this NPC, and update() just moves it.
+        self.think_elsewhere = False
         self.thought_text = None
         self.thought_timer = 0
         self.auto_move = False
         # For making certain tiles more costly in the pathfinding algorithm.
-        # Associate a GridNode with a high number to avoid travelling through it.
-        self.extra_costs: Dict[GridNode, float] = {} 
+        # How much each of the grid's cost layers (see cost_layers.py)
+        # matters to this NPC, e.g. {"stench": 10} makes every smelly tile
+        # cost 10 extra to walk onto. Add your own layers to grid.costs.
+        self.cost_weights: Dict[str, float] = {}
 
     def reset(self):
         # Reset positions to random valid locations
         while True:
-            new_x = random.randint(0, self.grid.size - 1)
-            new_y = random.randint(0, self.grid.size - 1)
+            new_x = self.random.randint(0, self.grid.size - 1)
+            new_y = self.random.randint(0, self.grid.size - 1)
             new_place = self.grid.get_node(new_x, new_y)
             # Ensure positions are not walls and not the same
             if new_place and not new_place.is_wall:
@@ -60,6 +74,25 @@ class Npc:
         else:
             return False
 
+    # Same as set_target(), but reads the path off `field`, a distance field
+    # out from the tile I'm on (see DistanceField.path_from()), instead of
+    # searching for it. The field has no extra costs in it, so NPCs with
+    # some still search.
+    def set_target_on(self, field, x: int, y: int):
+        costs = self.grid.costs.combine(self.cost_weights)
+        if costs and costs.any:
+            return self.set_target(x, y)
+        if not self.grid.is_valid_position(x, y):
+            return False
+        node = self.grid.get_node(x, y)
+        if not node or node.is_wall:
+            return False
+        self.target = Vector2(x, y)
+        # It walks from the target back to me, so flip it
+        self.path = [Vector2(node.x + 0.5, node.y + 0.5) for node in reversed(field.path_from((x, y)))]
+        self.current_path_index = 0
+        return bool(self.path)
+
     # NPCs come up with a target in this function.
     def think(self):
         raise NotImplementedError("Inherit this class and override this think() function!")
@@ -74,7 +107,9 @@ class Npc:
         # round the pos to a cell coordinate
         start_pos = self.position.to_grid_pos()
         target_pos = self.target.to_tuple()
-        path_nodes = self.pathfinder.find_path(start_pos, target_pos, self.extra_costs)
+        finder = self.planner or self.pathfinder
+        costs = self.grid.costs.combine(self.cost_weights)
+        path_nodes = finder.find_path(start_pos, target_pos, costs)
         # nodes to world coordinates (+0.5 offset gets you the center of the tile,
         # as each tile is 1 unit wide and tall).
         self.path = [Vector2(node.x + 0.5, node.y + 0.5) for node in path_nodes]
@@ -91,11 +126,8 @@ class Npc:
     # frame. This is for framerate-independent motion.
     def update(self, dt: float):
         # "Think" periodically
-        self.think_timer += dt
-        if self.think_timer >= self.THINK_INTERVAL:
-            self.think_timer = 0.0
-            if self.can_think:
-                self.think()
+        if not self.think_elsewhere and self.think_due(dt):
+            self.think()
             
         # Update thought timer
         if self.thought_text:
@@ -126,45 +158,67 @@ class Npc:
             move_dist = min(self.speed * dt, dist)
             self.position = self.position + dir * move_dist
 
+    # Moves the think timer along by dt. Returns true if it's time to think.
+    def think_due(self, dt: float) -> bool:
+        self.think_timer += dt
+        if self.think_timer >= self.THINK_INTERVAL:
+            self.think_timer = 0.0
+            return self.can_think
+        return False
+
+    # How many update(dt) calls in a row, starting now, would only count
+    # down timers and slide this NPC in a straight line without leaving its
+    # tile. skip() can do that many at once. The update() after them is
+    # where something happens: thinking, reaching a point on the path, or
+    # stepping onto another tile. (Rounds count the hider's exposure over
+    # skipped steps by assuming nobody changed tiles, see
+    # SimulationManager._run_single_round().)
+    def quiet_steps(self, dt: float) -> int:
+        steps = steps_under(self.think_timer, dt, self.THINK_INTERVAL)
+        if not steps or not self.path or self.current_path_index >= len(self.path):
+            return steps
+        # Plain numbers instead of Vector2s since this runs a lot, but the
+        # same math as update() and skip()
+        target = self.path[self.current_path_index]
+        x, y = self.position.x, self.position.y
+        dx, dy = target.x - x, target.y - y
+        dist = math.sqrt(dx ** 2 + dy ** 2)
+        step = self.speed * dt
+        if dist < 0.1 or step <= 0:
+            return 0 # onto the next point
+        # Moves that don't get it to the point (see update())
+        steps = min(steps, math.ceil((dist - max(step, 0.1)) / step))
+        # Moves that keep it on this tile
+        dir_x, dir_y = dx / dist, dy / dist
+        for p, d in ((x, dir_x), (y, dir_y)):
+            v = d * step
+            if v > 0:
+                steps = min(steps, math.ceil((math.floor(p) + 1 - p) / v) - 1)
+            elif v < 0:
+                steps = min(steps, math.floor((p - math.floor(p)) / -v))
+        # In case that rounded the wrong way
+        tile_x, tile_y = int(x), int(y)
+        while steps > 0 and (int(x + dir_x * (step * steps)) != tile_x or int(y + dir_y * (step * steps)) != tile_y):
+            steps -= 1
+        return max(steps, 0)
+
+    # Does `steps` update(dt) calls at once. Only call this with up to
+    # quiet_steps(dt) steps.
+    def skip(self, dt: float, steps: int) -> None:
+        elapsed = dt * steps
+        self.think_timer += elapsed
+        if self.thought_text:
+            self.thought_timer += elapsed
+            if self.thought_timer >= self.THOUGHT_DURATION:
+                self.thought_text = None
+                self.thought_timer = 0
+        if self.path and self.current_path_index < len(self.path):
+            dir = (self.path[self.current_path_index] - self.position).normalized()
+            self.position = self.position + dir * (self.speed * dt * steps) # like quiet_steps()
+
     # instead of doing print statements, it's cool to call
     # this which causes the string to appear over the npc's head
     # for a bit then fade away
     def emit_thought(self, text: str):
         self.thought_text = text
         self.thought_timer = 0
-
-    # When debug is true, extra helpful visuals are drawn.
-    def draw(self, surface: pygame.Surface, debug :bool):
-        pygame.draw.circle(
-            surface, self.color,
-            center = self.grid.grid_to_screen(self.position.x, self.position.y),
-            radius = self.grid.tile_size * 0.4
-        )
-        if self.auto_move:
-            if debug:
-                # the target it's going towards
-                if self.target:
-                    x, y = self.grid.grid_to_screen(self.target.x + 0.5, self.target.y + 0.5)
-                    size = self.grid.tile_size * 0.4
-                    # X shape
-                    pygame.draw.line(surface, self.color, 
-                                    (x - size, y - size), 
-                                    (x + size, y + size), 
-                                    width=3)
-                    pygame.draw.line(surface, self.color, 
-                                    (x + size, y - size), 
-                                    (x - size, y + size), 
-                                    width=3)    
-                # Only draw the path if auto_move is enabled
-                if self.path is not None and len(self.path) > 1:
-                    points = [
-                        self.grid.grid_to_screen(node.x, node.y)
-                        for node in self.path
-                    ]
-                    pygame.draw.lines(surface, self.color, False, points, width=3)
-            if self.thought_text:
-                font = pygame.font.Font(None, 24)
-                text_surface = font.render(self.thought_text, True, self.color)
-                text_rect = text_surface.get_rect(center=(self.grid.grid_to_screen(self.position.x, self.position.y - 1)))
-                text_surface.set_alpha(max(0, 255 * (1 - self.thought_timer / self.THOUGHT_DURATION)))
-                surface.blit(text_surface, text_rect)
@@ -1,105 +1,275 @@
+import copy
 import heapq
-from typing import Dict, List, Set, Tuple
+import threading
+from collections import OrderedDict
+from typing import List, Optional, Set, Tuple
 
-import pygame
-from constants import *
+from core.hierarchical_pathfinding import HierarchicalMap
+from core.jump_point_search import jump_point_search
+from models.bucket_queue import BucketQueue
+from models.cost_layers import CostField
 from models.grid import Grid
 from models.grid_node import GridNode
 
+# The scores for one search, kept in flat lists indexed like the grid.
+# Instead of resetting every tile before a search, each search gets a new
+# "generation" number, and a tile's g_score/came_from only count if its stamp
+# matches the current generation. So a search only pays for the tiles it
+# actually touches.
+class SearchScratch:
+    def __init__(self):
+        self.generation = 0
+        self.g_score: List[float] = []
+        self.came_from: List[int] = []
+        self.stamp: List[int] = []
+
+    # Starts a new search over `count` tiles and returns its generation.
+    def begin(self, count: int) -> int:
+        if len(self.stamp) != count: # first search, or the grid was resized
+            self.g_score = [0] * count
+            self.came_from = [-1] * count
+            self.stamp = [0] * count
+            self.generation = 0
+        self.generation += 1
+        return self.generation
+
+# Recent search results: (start, goal, costs key, search mode) -> tuple of
+# tile indices, oldest first. Only holds results for the wall layout it was
+# made for. Pathfinders for different NPCs share one, maybe from different
+# threads, so hold the lock while using it.
+class PathCache(OrderedDict):
+    def __init__(self, wall_version: int):
+        super().__init__()
+        self.wall_version = wall_version
+        self.lock = threading.Lock()
+
 # Handles finding a path from one position to another using the grid.
 # Runs the search algorithm.
+# Each NPC should search with its own copy from for_agent(), so that NPCs
+# can think at the same time (see think_pool.py).
 class Pathfinder:
-    def __init__(self, grid: Grid):
+    # `use_jps`: use Jump Point Search when there are no extra costs. It finds
+    # the same kind of paths while putting far fewer nodes in the queue on
+    # open maps. Searches with extra costs always use plain A*.
+    # `cache_size`: how many recent search results to remember (0 turns the
+    # cache off). NPCs ask for the same path over and over, like the seeker
+    # re-targeting a hider that's standing still.
+    # `cluster_size`: if given, searches with no extra costs that go further
+    # than one cluster use hierarchical pathfinding (see
+    # hierarchical_pathfinding.py). Meant for big maps.
+    # `use_buckets`: A* keeps its queue in a BucketQueue instead of a heap
+    # when every extra cost is a whole number. Same paths, less sorting.
+    # The extra costs come from the grid's cost layers, see cost_layers.py.
+    def __init__(self, grid: Grid, use_jps: bool = False, cache_size: int = 256, cluster_size: Optional[int] = None,
+                 use_buckets: bool = False):
         self.grid = grid
-        self.reset_path_data()
+        self.use_jps = use_jps
+        self.use_buckets = use_buckets
+        self.hierarchy = HierarchicalMap(grid, cluster_size) if cluster_size else None
+        self.scratch = SearchScratch()
+        self.cache = PathCache(grid.wall_version)
+        self.cache_size = cache_size
+        self.cache_hits = 0 # just metrics
+        self.cache_misses = 0
+        # Searches that were meant to use a BucketQueue but had costs that
+        # weren't whole numbers, so used the heap (see
+        # CostLayers.whole_numbers). Also just a metric, but it should be 0.
+        self.heap_fallbacks = 0
         self.path: List[GridNode] = []
-        self.visited_nodes: Set[GridNode] = set()
-        self.frontier_nodes: Set[GridNode] = set()
-    
-    def reset_path_data(self):
-        for row in self.grid.nodes:
-            for node in row:
-                node.reset_path_data()
-        self.path = []
-        self.visited_nodes = set()
-        self.frontier_nodes = set()
-    
+        # Tile indices the last search expanded/queued, for draw_debug().
+        # These are only filled in when record_debug is on.
+        self.visited_nodes: Set[int] = set()
+        self.frontier_nodes: Set[int] = set()
+        self.agents: List["Pathfinder"] = [] # made by for_agent()
+        self._record_debug = False
+
+    # Turning this on or off also does it for every for_agent() copy.
+    @property
+    def record_debug(self) -> bool:
+        return self._record_debug
+
+    @record_debug.setter
+    def record_debug(self, value: bool) -> None:
+        self._record_debug = value
+        for agent in self.agents:
+            agent.record_debug = value
+
+    # A pathfinder for a single NPC. It shares this one's settings,
+    # hierarchy and path cache, but has its own search state (scratch, path,
+    # debug info and cache metrics), so two NPCs never step on each other's
+    # searches.
+    def for_agent(self) -> "Pathfinder":
+        agent = copy.copy(self)
+        agent.scratch = SearchScratch()
+        agent.path = []
+        agent.visited_nodes = set()
+        agent.frontier_nodes = set()
+        agent.cache_hits = 0
+        agent.cache_misses = 0
+        agent.heap_fallbacks = 0
+        agent.agents = []
+        self.agents.append(agent)
+        return agent
+
+    # Uses `other`'s path cache and hierarchy, for a pathfinder on another
+    # grid with the same walls (see Grid.share_tables()). Call it before
+    # making any for_agent() copies, they share whatever this has.
+    def share_tables(self, other: "Pathfinder") -> None:
+        self.cache = other.cache
+        if self.hierarchy and other.hierarchy and self.hierarchy.cluster_size == other.hierarchy.cluster_size:
+            self.hierarchy = other.hierarchy
+
+    # Builds anything the grid and hierarchy only build when first asked
+    # for, so NPCs searching at the same time only have to read it.
+    def prepare(self) -> None:
+        self.grid.adjacency()
+        self.grid.wall_bytes()
+        if self.hierarchy:
+            self.hierarchy.update()
+
     # Given a node and the goal, calculate the heuristic that node
     # should have.
     @staticmethod
     def heuristic(node: GridNode, goal: GridNode) -> float:
         # simple distance for now
         return abs(node.x - goal.x) + abs(node.y - goal.y)
-    
-    # This is where the search algorithm happens!
+
+    # Forgets every remembered path.
+    def clear_cache(self) -> None:
+        with self.cache.lock:
+            self._clear_cache()
+
+    def _clear_cache(self) -> None:
+        self.cache.clear()
+        self.cache.wall_version = self.grid.wall_version
+
     # Finds a path from the start grid coordinates to the goal grid coordinates.
     # Returns an in-order list of nodes to travel to get to the goal.
-    def find_path(self, start: Tuple[int, int], goal: Tuple[int, int], extra_costs: Dict[GridNode, float] = {}) -> List[GridNode]:
-        self.reset_path_data() # clean up the frontier, node values, etc.
-        # The asterisk syntax here unpacks the single (x, y) coordinate
-        # tuple into two arguments.
-        start_node = self.grid.get_node(*start)
-        goal_node = self.grid.get_node(*goal)
-        if not start_node or not goal_node:
+    # `costs`: extra cost for stepping onto each tile (see
+    # CostLayers.combine()), or None if every step costs the same.
+    # Gives back a remembered result if the same search was done recently
+    # with the same walls and costs, otherwise runs _search().
+    def find_path(self, start: Tuple[int, int], goal: Tuple[int, int], costs: Optional[CostField] = None) -> List[GridNode]:
+        if self.cache_size <= 0:
+            return self._search(start, goal, costs)
+        grid = self.grid
+        # The costs are part of the key. No extra costs at all is the same
+        # as no costs.
+        costs_key = costs.key if costs and costs.any else ()
+        key = (start, goal, costs_key, self.use_jps, self.hierarchy is not None)
+        with self.cache.lock:
+            if self.cache.wall_version != grid.wall_version:
+                self._clear_cache() # the walls changed, so every old path is suspect
+            cached = self.cache.get(key)
+            if cached is not None:
+                self.cache.move_to_end(key)
+        if cached is not None:
+            self.cache_hits += 1
+            self.visited_nodes = set()
+            self.frontier_nodes = set()
+            self.path = [grid.node_at(i) for i in cached]
+            return self.path
+        self.cache_misses += 1
+        path = self._search(start, goal, costs)
+        with self.cache.lock:
+            self.cache[key] = tuple(node.index for node in path)
+            if len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False) # drop the least recently used
+        return path
+
+    # This is where the search algorithm happens!
+    def _search(self, start: Tuple[int, int], goal: Tuple[int, int], costs: Optional[CostField] = None) -> List[GridNode]:
+        self.path = []
+        self.visited_nodes = set()
+        self.frontier_nodes = set()
+        grid = self.grid
+        if not grid.is_valid_position(*start) or not grid.is_valid_position(*goal):
             return []
         # We're not checking if it starts in a wall since I want an NPC to get
         # out of a wall if it's in one, but never enter a wall on purpose.
-        if goal_node.is_wall: 
+        if grid.is_wall(*goal):
             return []
-        start_node.g_score = 0 # the cost to get here is 0 'cause we start here.
-        start_node.h_score = self.heuristic(start_node, goal_node)
-        open_set = [] # the list the priority queue will store things in.
-        # Python provides a priority queue implementation in this "heapq" thing.
-        # Since GridNodes can be compared with the < sign, the heapq will work with that
-        # and use that to find which node has the highest priority.
-        heapq.heappush(open_set, start_node)
-        # We will need to see if a given node is already in the priority queue,
-        # so to make that faster we can use a hash set for fast lookups
-        # instead of iterating over the priority queue.
-        # So, this open_set_hash will contain the same things as open_set.
-        open_set_hash = {start_node}
+        record = self.record_debug
+        visited, frontier = self.visited_nodes, self.frontier_nodes
+        uniform = not (costs and costs.any)
+        hierarchy = self.hierarchy
+        # An NPC stuck in a wall might only be able to step out into the next
+        # cluster over, which the hierarchy can't see, so leave that to A*.
+        if uniform and hierarchy and not grid.is_wall(*start) \
+        and max(abs(start[0] - goal[0]), abs(start[1] - goal[1])) > hierarchy.cluster_size:
+            path = hierarchy.find_path(start, goal, visited if record else None)
+            self.path = [grid.node_at(i) for i in path]
+            return self.path
+        if uniform and self.use_jps:
+            path = jump_point_search(
+                grid, start, goal, self.scratch,
+                visited if record else None, frontier if record else None
+            )
+            self.path = [grid.node_at(i) for i in path]
+            return self.path
+        size = grid.size
+        start_index = start[1] * size + start[0]
+        goal_index = goal[1] * size + goal[0]
+        goal_x, goal_y = goal
+        # Extra cost per tile index, all 0s if there aren't any
+        extra = costs.values if costs else grid.costs.zeros
+        adjacency = grid.adjacency()
+        buckets = self.use_buckets and (costs is None or costs.whole)
+        if self.use_buckets and not buckets:
+            self.heap_fallbacks += 1
+
+        generation = self.scratch.begin(size * size)
+        g_score = self.scratch.g_score
+        came_from = self.scratch.came_from
+        stamp = self.scratch.stamp
+        g_score[start_index] = 0 # the cost to get here is 0 'cause we start here.
+        came_from[start_index] = -1
+        stamp[start_index] = generation
+        # The priority queue holds (f score, tiebreaker, g score, tile index).
+        # Rather than moving a tile when its score improves, it gets pushed
+        # again and the old entry is skipped when it comes out (its g score
+        # won't match anymore).
+        # A BucketQueue holds (g score, tile index) under the f score, and
+        # keeps ties in push order by itself.
+        h = abs(start[0] - goal_x) + abs(start[1] - goal_y)
+        if buckets:
+            open_set = BucketQueue()
+            open_set.push(h, (0, start_index))
+        else:
+            open_set = [(h, 0, 0, start_index)]
+        pushes = 1
         while open_set: # So long as there are things to explore...
             # Expand the node with the lowest score.
-            current_node = heapq.heappop(open_set)
-            open_set_hash.remove(current_node)
-            self.visited_nodes.add(current_node)
-            if current_node == goal_node:
+            if buckets:
+                _, (g, current) = open_set.pop()
+            else:
+                _, _, g, current = heapq.heappop(open_set)
+            if g != g_score[current]:
+                continue # outdated entry
+            if record:
+                visited.add(current)
+            if current == goal_index:
                 # make the path, working backwards from the end
                 path = []
-                while current_node:
-                    path.append(current_node)
-                    current_node = current_node.came_from
+                while current != -1:
+                    path.append(grid.node_at(current))
+                    current = came_from[current]
                 # flip it
                 self.path = path[::-1]
                 return self.path # early return!
-            for neighbor in self.grid.get_neighbors(current_node):
+            for neighbor in adjacency[current]:
                 # This is where path costs get added up
-                move_cost = 1 + extra_costs.get(neighbor, 0)
-                m_g_score = current_node.g_score + move_cost
-                # i ought to better understand what is going on in
-                # this part...
-                if m_g_score < neighbor.g_score:
-                    neighbor.came_from = current_node
-                    neighbor.g_score = m_g_score
-                    neighbor.h_score = self.heuristic(neighbor, goal_node)
-                    if neighbor not in open_set_hash:
-                        heapq.heappush(open_set, neighbor)
-                        open_set_hash.add(neighbor)
-                        self.frontier_nodes.add(neighbor)
+                m_g_score = g + 1 + extra[neighbor]
+                if stamp[neighbor] != generation or m_g_score < g_score[neighbor]:
+                    stamp[neighbor] = generation
+                    came_from[neighbor] = current
+                    g_score[neighbor] = m_g_score
+                    h = abs(neighbor % size - goal_x) + abs(neighbor // size - goal_y)
+                    if buckets:
+                        open_set.push(m_g_score + h, (m_g_score, neighbor))
+                    else:
+                        heapq.heappush(open_set, (m_g_score + h, pushes, m_g_score, neighbor))
+                        pushes += 1
+                    if record:
+                        frontier.add(neighbor)
         return []
-    
-    # Draws visuals to see what the AI is doing e.g. what path it's taking.
-    def draw_debug(self, surface: pygame.Surface):
-        for node in self.visited_nodes:
-            x, y = self.grid.grid_to_screen(node.x + 0.5, node.y + 0.5)
-            pygame.draw.circle(surface, VISITED_NODE_COLOR, (x, y), self.grid.tile_size * 0.1)
-        for node in self.frontier_nodes:
-            x, y = self.grid.grid_to_screen(node.x + 0.5, node.y + 0.5)
-            pygame.draw.circle(surface, FRONTIER_NODE_COLOR, (x, y), self.grid.tile_size * 0.1)
-        # the path
-        if len(self.path) > 1:
-            points = [
-                self.grid.grid_to_screen(node.x + 0.5, node.y + 0.5)
-                for node in self.path
-            ]
-            pygame.draw.lines(surface, PATH_COLOR, False, points, width=3)
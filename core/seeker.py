@@ -1,9 +1,13 @@
-import random
-import pygame
+from math import inf
+from typing import List, Tuple
 from constants import *
+from core.incremental_planner import IncrementalPlanner
 from core.npc import Npc
 from core.pathfinder import Pathfinder
+from models.belief_map import BeliefMap
+from models.game_clock import steps_under
 from models.grid import Grid
+from models.grid_storage import HAS_NUMPY, np
 from models.vector import Vector2
 
 class Seeker(Npc):
@@ -12,17 +16,40 @@ class Seeker(Npc):
     # of a new round.
     FREEZE_TIME = 5.0
     STINK_INTERVAL = 0.5 # every X seconds
-    def __init__(self, grid: Grid, pathfinder: Pathfinder, color: pygame.Color, can_think: bool):
+    # A tile has to go unseen for more than this many thinks before it's
+    # worth exploring.
+    EXPLORE_AGE = 5
+    # With a belief map, how many steps the hider might have taken between
+    # thinks (it spreads the odds this many times).
+    BELIEF_STEPS = 2
+    # `use_belief_map`: instead of going for the tiles it hasn't seen in a
+    # while, keep odds of where the hider could be and go where they're
+    # highest (see belief_map.py).
+    # `explore_distance_weight`: see the attribute of the same name.
+    def __init__(self, grid: Grid, pathfinder: Pathfinder, color: Tuple[int, int, int], can_think: bool, use_belief_map: bool = False,
+                 explore_distance_weight: float = 0.0):
         super().__init__(grid, pathfinder, color, can_think)
+        # The seeker replans a lot while little changes (it took a few steps,
+        # or the user painted walls off its path), so it reuses its last
+        # path when that's still good instead of searching again.
+        self.planner = IncrementalPlanner(grid, self.pathfinder)
         self.auto_move = True
         self.hider_ref = None
-        self.last_seen_time = 0  # Last time the Hider was seen
-        self.tile_memory = {
-            (x, y): 0
-            for x in range(self.grid.size)
-            for y in range(self.grid.size)
-            if not self.grid.get_node(x, y).is_wall # when user draws tiles, tile_memory can end up having wall nodes in it, which is bad. need a tile_memory_refresh function to recalculate this.
-        }
+        self.last_seen_time = 0  # Last time the Hider was seen, by the game clock
+        # How many times I've thought about exploring since I last saw each
+        # tile (by index, like the grid). Walls get ages too, but they're
+        # never reachable so they never get picked, and nothing needs
+        # redoing when the walls change.
+        count = self.grid.size * self.grid.size
+        self.tile_ages = np.zeros(count, dtype=np.int64) if HAS_NUMPY else [0] * count
+        # How much a tile's distance counts against its age when picking
+        # where to explore. 0 means just go for the oldest tile, anything
+        # more prefers old tiles that are closer.
+        self.explore_distance_weight = explore_distance_weight
+        self.belief = BeliefMap(grid) if use_belief_map else None
+        # When auto_move is off, the directions (dx, dy) the player is
+        # pushing it in this frame. The app fills this in from the keyboard.
+        self.steering: List[Tuple[int, int]] = []
         self.start_position = self.position
         self.stink_timer = 0
         self.freeze_timer = self.FREEZE_TIME
@@ -36,15 +63,6 @@ class Seeker(Npc):
     def set_hider(self, hider):
         self.hider_ref = hider
 
-    def refresh_tile_memory(self):
-        """Refresh the tile memory to exclude wall nodes."""
-        self.tile_memory = {
-            (x, y): 0
-            for x in range(self.grid.size)
-            for y in range(self.grid.size)
-            if not self.grid.get_node(x, y).is_wall
-        }
-
     def think(self):
         if self.is_frozen():
             self.emit_thought(f"Frozen ({round(self.freeze_timer, 1)}s)")
@@ -53,39 +71,35 @@ class Seeker(Npc):
             self.emit_thought("No hider to track.")
             return
 
-        # Refresh tile memory if tiles have changed
-        if self.grid.tiles_changed:  # Assuming `tiles_changed` is a flag set when tiles are modified
-            self.refresh_tile_memory()
-            self.grid.tiles_changed = False
-
         hider_pos = self.hider_ref.position.to_grid_pos()
         seeker_pos = self.position.to_grid_pos()
 
         if not self.grid.is_wall_between(seeker_pos, hider_pos):
             # If the Hider is in sight, follow it
             self.emit_thought(f"Hider seen at {hider_pos}!")
-            self.last_seen_time = pygame.time.get_ticks() / 1000
+            self.last_seen_time = self.clock.now()
+            if self.belief:
+                self.belief.found(hider_pos[1] * self.grid.size + hider_pos[0])
             self.set_target(*hider_pos)
             return
+
+        if self.belief:
+            self.follow_belief(seeker_pos)
+            return
             
-        current_time = pygame.time.get_ticks() / 1000  # Get current time in seconds
+        current_time = self.clock.now()  # Get current (game) time in seconds
         time_since_seen = current_time - self.last_seen_time
 
         if time_since_seen < 3 and self.grid.is_wall_between(seeker_pos, hider_pos):
             # If the Seeker loses sight, predict the Hider's next position based on direction
             predicted_pos = self.predict_hider_position(hider_pos)
             self.emit_thought(f"Hider escaped sight, he might be here!")
-            self.set_target(*predicted_pos)
+            self.set_target_on(self.grid.distances.from_tile(*seeker_pos), *predicted_pos)
             return
 
         else:
             # Update tile memory
-            visible_tiles = self.grid.get_visible_tiles(seeker_pos)
-            for pos in self.tile_memory:
-                if pos in visible_tiles:
-                    self.tile_memory[pos] = 0
-                else:
-                    self.tile_memory[pos] += 1
+            self.age_tiles(seeker_pos)
 
             # Check if Seeker can find a target tile (unexplored or unexplored recently)
             target = self.find_best_target()
@@ -94,72 +108,142 @@ class Seeker(Npc):
                 self.emit_thought(f"Exploring unexplored area: {target}")
                 target_node = self.grid.get_node(*target)
                 #print(f"Target node at {target} is a wall: {target_node.is_wall}")
-                self.set_target(*target)
+                # The field find_best_target() picked it with already has the way there
+                self.set_target_on(self.grid.distances.from_tile(*seeker_pos), *target)
             else:
                 # Log the issue if no target was found
                 self.emit_thought("No target found, wandering randomly.")
                 # Fallback to random wandering if no target is found
                 for _ in range(50):  # Try up to 50 times to find a walkable random tile
-                    x = random.randint(0, self.grid.size - 1)
-                    y = random.randint(0, self.grid.size - 1)
+                    x = self.random.randint(0, self.grid.size - 1)
+                    y = self.random.randint(0, self.grid.size - 1)
                     if self.set_target(x, y):
                         break
 
+    # Updates the odds of where the hider is and heads for the best spot.
+    def follow_belief(self, seeker_pos):
+        belief = self.belief
+        belief.diffuse(self.BELIEF_STEPS) # it's had time to move
+        belief.observe(self.grid.visibility.mask(seeker_pos[1] * self.grid.size + seeker_pos[0])) # and it's not anywhere I can see
+        reach = self.grid.distances.from_tile(*seeker_pos)
+        target = belief.best_target(reach)
+        if target:
+            self.emit_thought(f"Hider's probably near {target}")
+            self.set_target_on(reach, *target)
+        else:
+            self.emit_thought("No idea where the hider went.")
+
+    # Everything I can see from here is brand new again, everything else
+    # gets a bit older.
+    def age_tiles(self, seeker_pos):
+        visible = self.grid.visibility.mask(seeker_pos[1] * self.grid.size + seeker_pos[0])
+        if HAS_NUMPY:
+            self.tile_ages += 1
+            self.tile_ages[np.frombuffer(visible, dtype=np.uint8).astype(bool)] = 0
+        else:
+            self.tile_ages = [0 if v else age + 1 for age, v in zip(self.tile_ages, visible)]
+
+    # The oldest tile I can get to (see explore_distance_weight), or None if
+    # nothing's old enough. Ties go to the leftmost column, then the top.
     def find_best_target(self):
-        unexplored_tiles = [(x, y) for (x, y), time in self.tile_memory.items() if time > 5] 
-        if unexplored_tiles:
-            self.emit_thought(f"Unexplored tiles: {unexplored_tiles}")
-            return max(unexplored_tiles, key=lambda pos: self.tile_memory[pos])
-        self.emit_thought("No unexplored tiles found!")
-        return None
+        # Tiles we can't get to aren't worth picking
+        reach = self.grid.distances.from_tile(*self.position.to_grid_pos())
+        size = self.grid.size
+        weight = self.explore_distance_weight
+        if HAS_NUMPY:
+            ages = self.tile_ages
+            dist = np.frombuffer(reach.dist, dtype=np.float64)
+            candidates = (ages > self.EXPLORE_AGE) & (dist != inf)
+            if not candidates.any():
+                self.emit_thought("No unexplored tiles found!")
+                return None
+            scores = ages - weight * dist if weight else ages.astype(np.float64)
+            scores = np.where(candidates, scores, -inf)
+            # Transposed so ties go column by column
+            best = int(np.argmax(scores.reshape(size, size).T))
+            count = int(candidates.sum())
+            target = (best // size, best % size)
+        else:
+            ages, dist = self.tile_ages, reach.dist
+            target, best_score, count = None, -inf, 0
+            for x in range(size):
+                for i in range(x, size * size, size): # down the column
+                    if ages[i] > self.EXPLORE_AGE and dist[i] != inf:
+                        count += 1
+                        score = ages[i] - weight * dist[i]
+                        if score > best_score:
+                            target, best_score = (x, i // size), score
+            if target is None:
+                self.emit_thought("No unexplored tiles found!")
+                return None
+        self.emit_thought(f"Unexplored tiles: {count}")
+        return target
 
 
     def predict_hider_position(self, last_pos):
         # Search around the last seen position 
         radius = 5 
-        random.shuffle(DIRECTIONS := [(dx, dy) for dx in range(-radius, radius + 1)
+        self.random.shuffle(DIRECTIONS := [(dx, dy) for dx in range(-radius, radius + 1)
                                                 for dy in range(-radius, radius + 1)
                                                 if (dx != 0 or dy != 0)])
+        reach = self.grid.distances.from_tile(*self.position.to_grid_pos())
         for dx, dy in DIRECTIONS:
             x = last_pos[0] + dx
             y = last_pos[1] + dy
             if 0 <= x < self.grid.size and 0 <= y < self.grid.size:
-                node = self.grid.get_node(x, y)
-                if node and not node.is_wall:
+                # Walls are never reachable, so this skips those too
+                if reach.reachable(x, y):
                     return (x, y)
         return last_pos
 
+    def reset(self):
+        super().reset()
+        if self.belief:
+            self.belief.reset()
+
+    # Only thinks for itself when it's not being steered by the keyboard.
+    def think_due(self, dt: float) -> bool:
+        return self.auto_move and super().think_due(dt)
+
+    # Only moves in straight lines when it's following a path, and the
+    # stinking and the end of the freeze (when it can catch the hider) are
+    # things that happen too.
+    def quiet_steps(self, dt: float) -> int:
+        if not self.auto_move:
+            return 0
+        steps = min(super().quiet_steps(dt), steps_under(self.stink_timer, dt, self.STINK_INTERVAL))
+        if self.is_frozen():
+            steps = min(steps, steps_under(-self.freeze_timer, dt, 0))
+        return steps
+
+    def skip(self, dt: float, steps: int) -> None:
+        self.stink_timer += dt * steps
+        self.freeze_timer -= dt * steps
+        super().skip(dt, steps)
+
+    # Leaves my stench around the tile I'm on.
+    def stink(self):
+        self.grid.stink_it(*self.position.to_grid_pos(), radius=8, source=self)
+
     def update(self, dt: float):
         self.stink_timer += dt
         self.freeze_timer -= dt
         if self.stink_timer >= self.STINK_INTERVAL:
             self.stink_timer = 0.0
-            self.grid.stink_it(*self.position.to_grid_pos(), radius=8)
+            self.stink()
         if self.auto_move:
             super().update(dt) 
         else:
-            keys = pygame.key.get_pressed()
-            # Handle manual movement if any movement keys are pressed
-            if not self.auto_move and any(keys[key] for key in [pygame.K_w, pygame.K_s, pygame.K_a, pygame.K_d, 
-                                        pygame.K_UP, pygame.K_DOWN, pygame.K_LEFT, pygame.K_RIGHT]):
+            # Handle manual movement if it's being steered
+            if self.steering:
                 self.last_key_time = 0.0 
-                self.manual_move(keys, dt)
-
-    def manual_move(self, keys, dt):
-        # Manual movement using WASD or Arrow keys.
-        directions = {
-            pygame.K_w: (0, -1),
-            pygame.K_s: (0, 1),
-            pygame.K_a: (-1, 0),
-            pygame.K_d: (1, 0),
-            pygame.K_UP: (0, -1),
-            pygame.K_DOWN: (0, 1),
-            pygame.K_LEFT: (-1, 0),
-            pygame.K_RIGHT: (1, 0)
-        }
-        for key, (dx, dy) in directions.items():
-            if keys[key]:
-                self.move(dx, dy, dt)
+                self.manual_move(self.steering, dt)
+
+    # Manual movement, one step per direction being pushed (each is
+    # checked against the walls on its own, so you can slide along them).
+    def manual_move(self, directions, dt):
+        for dx, dy in directions:
+            self.move(dx, dy, dt)
 
     def move(self, dx, dy, dt):
         # Normalize it so going diagonal isn't faster
@@ -0,0 +1,44 @@
+# Lets NPCs think at the same time, on a pool of threads.
+#
+# Thinking only reads the grid: each NPC searches with its own copy of the
+# pathfinder (see Pathfinder.for_agent()), and the caches the grid shares
+# between NPCs (visibility, distance fields, paths, the hierarchy) lock
+# around their updates. So every NPC that's due to think can do it at once,
+# and then they all move one after the other like usual.
+#
+# With the GIL the threads mostly just take turns, so this is off by
+# default (see THINK_THREADS). It pays off on free-threaded Python (3.13t)
+# and with lots of NPCs, or wherever the thinking lets go of the GIL (numpy).
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+
+from core.npc import Npc
+from core.pathfinder import Pathfinder
+
+class ThinkPool:
+    # `pathfinder`: the one the NPCs' pathfinders were made from.
+    def __init__(self, npcs: List[Npc], pathfinder: Pathfinder, workers: int):
+        self.npcs = npcs
+        self.pathfinder = pathfinder
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="think")
+        for npc in npcs:
+            npc.think_elsewhere = True
+
+    # Call this every frame, before updating the NPCs.
+    def think(self, dt: float) -> None:
+        due = [npc for npc in self.npcs if npc.think_due(dt)]
+        if len(due) <= 1:
+            for npc in due:
+                npc.think() # not worth a trip to another thread
+            return
+        # Build the lazy stuff up front instead of having every thread
+        # wait on whichever one got there first.
+        self.pathfinder.prepare()
+        # list() waits for all of them, and re-raises if any of them failed
+        list(self.executor.map(lambda npc: npc.think(), due))
+
+    # Hands thinking back to the NPCs' own update().
+    def close(self) -> None:
+        for npc in self.npcs:
+            npc.think_elsewhere = False
+        self.executor.shutdown()
@@ -44,16 +44,14 @@ class LevelManager:
                 level_data = json.load(f)
             
             # Reset grid
-            for y in range(grid.size):
-                for x in range(grid.size):
-                    grid.get_node(x, y).is_wall = False
+            grid.clear()
             
             # Load walls
             for x, y in level_data["walls"]:
-                grid.get_node(x, y).is_wall = True
+                grid.set_wall(x, y, True)
             
-            # Mark tiles as changed
-            grid.tiles_changed = True
+            # Throw away anything that was worked out from the old walls
+            grid.visibility.invalidate()
 
             # Load NPC position
             npc.position = vector_class(*level_data["npc_position"])
@@ -67,6 +65,12 @@ class LevelManager:
                 npc.path = []
             
             print(f"Level loaded: {filename}")
+            # Point out any open areas you can't walk to from the rest
+            open_tiles = bytes(not w for w in grid.wall_bytes())
+            sizes = grid.label_components(open_tiles)[1]
+            if len(sizes) > 1:
+                print(f"Note: the open tiles are split into {len(sizes)} separate areas "
+                      f"(sizes {sorted(sizes, reverse=True)}). NPCs can't cross between them.")
             return True
         except FileNotFoundError:
             print(f"Error: Level '{level_name}' not found.")
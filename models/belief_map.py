@@ -0,0 +1,184 @@
+# A belief map: for every tile, how likely it is that the hider is there.
+# The odds add up to 1 over the whole grid.
+#
+# - found(): the hider was seen, so it's definitely on that tile.
+# - observe(): the hider isn't anywhere I can see, so those tiles go to 0
+#   and the rest get scaled back up to add up to 1.
+# - diffuse(): time passed, so the hider might have moved. Every tile passes
+#   some of its odds on to the tiles you can step to from it (the same moves
+#   as Grid.get_neighbors()), so the odds spread out around corners and
+#   through doorways but never through walls.
+#
+# With NumPy, a diffuse() step is a handful of shifted array adds (one per
+# direction) over the whole grid, which stays quick even on 256x256 maps.
+# Without it, it goes through grid.adjacency().
+from math import inf
+from typing import Optional, Tuple
+
+from models.grid_storage import HAS_NUMPY, np
+
+# The 8 directions you can step in, as (dx, dy)
+DIRECTIONS = [(dx, dy) for dx in (-1, 0, 1) for dy in (-1, 0, 1) if dx or dy]
+
+
+class BeliefMap:
+    # How much of each tile's odds moves on per diffuse() step. The rest
+    # stays put (all of it moving would make the odds flicker back and forth).
+    SPREAD = 0.5
+
+    def __init__(self, grid, use_numpy: bool = HAS_NUMPY):
+        self.grid = grid
+        self.use_numpy = use_numpy and HAS_NUMPY
+        self.wall_version = -1
+        self.odds = None
+        self.reset()
+
+    # Forgets everything: the hider could be on any open tile.
+    def reset(self) -> None:
+        self._check_walls()
+        open_tiles = [0.0 if w else 1.0 for w in self.grid.wall_bytes()]
+        self.odds = np.array(open_tiles) if self.use_numpy else open_tiles
+        self._normalize()
+
+    def probability(self, x: int, y: int) -> float:
+        return float(self.odds[y * self.grid.size + x])
+
+    # The hider was seen on this tile (by flat index).
+    def found(self, index: int) -> None:
+        self._check_walls()
+        count = self.grid.size * self.grid.size
+        self.odds = np.zeros(count) if self.use_numpy else [0.0] * count
+        self.odds[index] = 1.0
+
+    # The hider isn't on any tile set in `visible` (a bytes-like mask
+    # indexed like the grid). If that rules out everywhere it could be,
+    # start over.
+    def observe(self, visible) -> None:
+        self._check_walls()
+        self._rule_out(visible)
+        if not self._normalize():
+            self.reset()
+            self._rule_out(visible)
+            self._normalize()
+
+    # Lets the odds spread out, `steps` moves' worth.
+    def diffuse(self, steps: int = 1) -> None:
+        self._check_walls()
+        for _ in range(steps):
+            if self.use_numpy:
+                self._diffuse_numpy()
+            else:
+                self._diffuse_lists()
+
+    # The tile I can get to with the most odds on and right around it, or
+    # None if there's nowhere I can get to with any odds at all.
+    # `reach` is a DistanceField out from where I am.
+    def best_target(self, reach) -> Optional[Tuple[int, int]]:
+        self._check_walls()
+        size = self.grid.size
+        if self.use_numpy:
+            region = self._region_numpy()
+            reachable = np.frombuffer(reach.dist, dtype=np.float64) != inf
+            region = np.where(reachable & (region > 0), region, -inf)
+            best = int(np.argmax(region))
+            if region[best] == -inf:
+                return None
+        else:
+            odds = self.odds
+            adjacency = self.grid.adjacency()
+            walls = self.grid.wall_bytes()
+            best, best_mass = -1, 0.0
+            for i, moves in enumerate(adjacency):
+                if reach.dist[i] == inf or walls[i]:
+                    continue
+                mass = odds[i] + sum(odds[n] for n in moves)
+                if mass > best_mass:
+                    best, best_mass = i, mass
+            if best == -1:
+                return None
+        return (best % size, best // size)
+
+    # Sets the odds to 0 wherever `mask` is set.
+    def _rule_out(self, mask) -> None:
+        if self.use_numpy:
+            self.odds[np.frombuffer(mask, dtype=np.uint8).astype(bool)] = 0
+        else:
+            self.odds = [0.0 if m else p for p, m in zip(self.odds, mask)]
+
+    # Makes the odds add up to 1. Returns false if they're all 0.
+    def _normalize(self) -> bool:
+        total = float(self.odds.sum()) if self.use_numpy else sum(self.odds)
+        if total <= 0:
+            return False
+        if self.use_numpy:
+            self.odds /= total
+        else:
+            self.odds = [p / total for p in self.odds]
+        return True
+
+    # Rebuilds the moves if the walls changed. Odds that were on what's
+    # now a wall get spread over everywhere else.
+    def _check_walls(self) -> None:
+        grid = self.grid
+        if self.wall_version == grid.wall_version:
+            return
+        self.wall_version = grid.wall_version
+        walls = grid.wall_bytes()
+        if self.use_numpy:
+            self._build_moves(walls)
+        if self.odds is not None:
+            self._rule_out(walls)
+            if not self._normalize():
+                self.reset()
+
+    # For each direction, a 2D mask of the tiles you can step that way
+    # from, plus how many ways you can step from each tile. Walls are
+    # padded around the edge so every shift stays in bounds.
+    def _build_moves(self, walls: bytes) -> None:
+        size = self.grid.size
+        wall = np.pad(np.frombuffer(walls, dtype=np.uint8).astype(bool).reshape(size, size), 1, constant_values=True)
+        here = ~wall[1:-1, 1:-1]
+        self.moves = []
+        for dx, dy in DIRECTIONS:
+            there = ~wall[1 + dy:1 + dy + size, 1 + dx:1 + dx + size]
+            can = here & there
+            if dx and dy: # no squeezing between two walls diagonally
+                can &= ~(wall[1:-1, 1 + dx:1 + dx + size] & wall[1 + dy:1 + dy + size, 1:-1])
+            self.moves.append((dx, dy, can))
+        self.exits = sum(can.astype(np.int64) for _, _, can in self.moves)
+
+    def _diffuse_numpy(self) -> None:
+        size = self.grid.size
+        odds = self.odds.reshape(size, size)
+        exits = self.exits
+        # What each tile passes to each of its neighbors
+        share = np.divide(odds * self.SPREAD, exits, out=np.zeros_like(odds), where=exits > 0)
+        new = np.pad(np.where(exits > 0, odds * (1 - self.SPREAD), odds), 1)
+        for dx, dy, can in self.moves:
+            new[1 + dy:1 + dy + size, 1 + dx:1 + dx + size] += share * can
+        self.odds = new[1:-1, 1:-1].ravel()
+
+    def _diffuse_lists(self) -> None:
+        odds = self.odds
+        adjacency = self.grid.adjacency()
+        walls = self.grid.wall_bytes()
+        new = list(odds)
+        for i, p in enumerate(odds):
+            moves = adjacency[i]
+            if not p or not moves or walls[i]: # odds stuck in a wall stay there, like _build_moves()
+                continue
+            new[i] -= p * self.SPREAD
+            share = p * self.SPREAD / len(moves)
+            for n in moves:
+                new[n] += share
+        self.odds = new
+
+    # Odds on each tile plus on every tile one step away (the same steps as
+    # diffuse()).
+    def _region_numpy(self):
+        size = self.grid.size
+        odds = np.pad(self.odds.reshape(size, size), 1)
+        region = odds[1:-1, 1:-1].copy()
+        for dx, dy, can in self.moves:
+            region += odds[1 + dy:1 + dy + size, 1 + dx:1 + dx + size] * can
+        return region.ravel()
@@ -0,0 +1,44 @@
+# Bucket queue (Dial's algorithm).
+# When every priority is a small whole number, a priority queue can just be
+# a list of buckets, one per priority. Pushing is appending to a bucket and
+# popping is taking from the first bucket that isn't empty, so there's no
+# heap shuffling or comparing at all.
+#
+# Items with the same priority come out in the order they went in, which
+# is the same order heapq gives when entries carry a push counter as a
+# tiebreaker. Priorities are allowed to go back down after a pop (A* with
+# an inconsistent heuristic does that), the queue just looks further back.
+from collections import deque
+from typing import Any, List, Tuple
+
+class BucketQueue:
+    def __init__(self):
+        self.buckets: List[deque] = []
+        self.cursor = 0 # no bucket before this one has anything in it
+        self.count = 0
+
+    def __len__(self) -> int:
+        return self.count
+
+    def push(self, priority: int, item: Any) -> None:
+        buckets = self.buckets
+        if priority >= len(buckets):
+            # grow by at least double so this doesn't happen often
+            buckets.extend(deque() for _ in range(max(priority + 1, 2 * len(buckets)) - len(buckets)))
+        buckets[priority].append(item)
+        if priority < self.cursor:
+            self.cursor = priority
+        self.count += 1
+
+    # Takes out the oldest item with the lowest priority.
+    # Returns (priority, item).
+    def pop(self) -> Tuple[int, Any]:
+        if not self.count:
+            raise IndexError("pop from an empty BucketQueue")
+        buckets = self.buckets
+        cursor = self.cursor
+        while not buckets[cursor]:
+            cursor += 1
+        self.cursor = cursor
+        self.count -= 1
+        return cursor, buckets[cursor].popleft()
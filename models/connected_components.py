@@ -0,0 +1,64 @@
+# Connected-component labeling.
+# Splits the tiles set in a mask into groups you can walk between without
+# leaving the mask, using the same moves as the pathfinder. It's the classic
+# two-pass method: one raster sweep joins every tile to the neighbors
+# already swept (left, up-left, up, up-right) with union-find, and a second
+# sweep hands out the final labels and counts how big each group is.
+from typing import List, Tuple
+
+from models.resumable import finish
+
+# `adjacency` is Grid.adjacency() and `mask` is bytes-like, indexed like the
+# grid. Moves are the same both ways between open tiles, so the mask should
+# only have open tiles in it.
+# Returns (labels, sizes): labels has each tile's group number, or -1 if
+# it's not in the mask, and sizes[label] is how many tiles that group has.
+# Groups are numbered in the order their first tile shows up.
+def label_components(adjacency, mask) -> Tuple[List[int], List[int]]:
+    return finish(label_components_steps(adjacency, mask))
+
+# Same as label_components(), as a resumable job (see resumable.py) that
+# stops after every `chunk` tiles of each sweep.
+def label_components_steps(adjacency, mask, chunk: int = 1024):
+    count = len(adjacency)
+    parent = list(range(count))
+
+    def find(i: int) -> int:
+        root = i
+        while parent[root] != root:
+            root = parent[root]
+        while parent[i] != root: # point everything on the way at the root
+            parent[i], i = root, parent[i]
+        return root
+
+    for start in range(0, count, chunk):
+        for i in range(start, min(start + chunk, count)):
+            if not mask[i]:
+                continue
+            for neighbor in adjacency[i]:
+                if neighbor < i and mask[neighbor]:
+                    a, b = find(i), find(neighbor)
+                    if a != b:
+                        # the lower index stays the root, so roots come in raster order
+                        if a < b:
+                            parent[b] = a
+                        else:
+                            parent[a] = b
+        yield
+
+    labels = [-1] * count
+    sizes: List[int] = []
+    root_labels = {}
+    for start in range(0, count, chunk):
+        for i in range(start, min(start + chunk, count)):
+            if not mask[i]:
+                continue
+            root = find(i)
+            label = root_labels.get(root)
+            if label is None:
+                label = root_labels[root] = len(sizes)
+                sizes.append(0)
+            labels[i] = label
+            sizes[label] += 1
+        yield
+    return labels, sizes
@@ -0,0 +1,130 @@
+# Cost layers.
+# A cost layer is a named list of extra costs, one per tile (indexed like
+# the grid). Searches add a tile's extra cost to every step onto it.
+#
+# NPCs don't hand the pathfinder a dict of costs of their own. They say
+# which layers they care about and how much (like {"stench": 10}), and
+# combine() adds those up into one CostField. Fields are kept until one of
+# the layers they were made from changes, so NPCs asking for the same mix
+# share one, and nothing gets redone between changes.
+#
+# A layer is either filled in by hand (set()/fill()), or built by a
+# function whenever some version number it's based on changes, like the
+# stench layer from grid.stench_version.
+import itertools
+import threading
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+# Every change to any layer gets a new number from here, so a layer's
+# (name, version) never comes up twice, even if it's removed and added again.
+_versions = itertools.count(1)
+
+
+class CostLayer:
+    # `build`: makes the values (an iterable with one number per tile).
+    # `source_version`: build gets called again whenever this returns
+    # something new.
+    def __init__(self, name: str, count: int, build: Optional[Callable[[], Iterable[float]]] = None,
+                 source_version: Optional[Callable[[], int]] = None):
+        self.name = name
+        self.values: List[float] = [0] * count
+        self.version = next(_versions)
+        self.build = build
+        self.source_version = source_version
+        self.built_for = None # what source_version() said last build
+
+    # Rebuilds the values if what they're built from changed.
+    def refresh(self) -> None:
+        if self.build is None:
+            return
+        source = self.source_version() if self.source_version else None
+        if self.built_for is None or source != self.built_for:
+            self.values = list(self.build())
+            self.built_for = source
+            self.version = next(_versions)
+
+    def set(self, index: int, value: float) -> None:
+        if self.values[index] != value:
+            self.values[index] = value
+            self.version = next(_versions)
+
+    def fill(self, values: Iterable[float]) -> None:
+        self.values = list(values)
+        self.version = next(_versions)
+
+
+# A weighted mix of layers, ready for a search.
+class CostField:
+    def __init__(self, values: List[float], key: Tuple):
+        # Extra cost per tile
+        self.values = values
+        # Which layers, weights and versions it's made of. Two fields with
+        # the same key have the same values.
+        self.key = key
+        # Whether any tile costs extra at all. If not, searches can treat
+        # every step the same (and use JPS/HPA*).
+        self.any = any(values)
+        # Whether every cost is a whole number, so searches can use a
+        # BucketQueue. If so, the values are ints.
+        self.whole = all(float(v).is_integer() for v in values)
+        if self.whole:
+            self.values = [int(v) for v in values]
+
+
+class CostLayers:
+    def __init__(self, grid):
+        self.grid = grid
+        self.layers: Dict[str, CostLayer] = {}
+        # weights key -> the last field made for it
+        self.fields: Dict[Tuple, CostField] = {}
+        # A 0 for every tile, for searches with no extra costs
+        self.zeros: List[int] = [0] * (grid.size * grid.size)
+        # Round every combined cost to a whole number, so searches can use a
+        # BucketQueue (see Pathfinder's use_buckets). Layers like the
+        # stench's fading trail are fractions, which would rule that out.
+        self.whole_numbers = False
+        # NPCs thinking on different threads share these
+        self.lock = threading.Lock()
+
+    # Adds a layer (or replaces the one with the same name) and returns it.
+    # See CostLayer for `build` and `source_version`.
+    def add_layer(self, name: str, build: Optional[Callable[[], Iterable[float]]] = None,
+                  source_version: Optional[Callable[[], int]] = None) -> CostLayer:
+        layer = CostLayer(name, self.grid.size * self.grid.size, build, source_version)
+        with self.lock:
+            self.layers[name] = layer
+        return layer
+
+    def remove_layer(self, name: str) -> None:
+        with self.lock:
+            self.layers.pop(name, None)
+
+    def layer(self, name: str) -> CostLayer:
+        layer = self.layers[name]
+        layer.refresh()
+        return layer
+
+    # Adds up the named layers, each times its weight. Layers with a weight
+    # of 0 (or that don't exist) are left out.
+    # Returns None if that leaves nothing, meaning every step costs the same.
+    def combine(self, weights: Dict[str, float]) -> Optional[CostField]:
+        weights_key = tuple(sorted(
+            (name, weight) for name, weight in weights.items()
+            if weight and name in self.layers
+        ))
+        if not weights_key:
+            return None
+        with self.lock:
+            layers = [self.layer(name) for name, _ in weights_key]
+            key = (weights_key, tuple(layer.version for layer in layers), self.whole_numbers)
+            field = self.fields.get(weights_key)
+            if field is not None and field.key == key:
+                return field
+            values = [0] * (self.grid.size * self.grid.size)
+            for layer, (_, weight) in zip(layers, weights_key):
+                values = [total + weight * value for total, value in zip(values, layer.values)]
+            if self.whole_numbers:
+                values = [round(value) for value in values]
+            field = CostField(values, key)
+            self.fields[weights_key] = field
+            return field
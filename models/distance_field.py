@@ -0,0 +1,209 @@
+# Distance fields (a.k.a. Dijkstra maps or flow fields).
+# A distance field holds, for every tile, how far it is from the nearest of
+# some source tiles. One field answers "how far is everything from here?"
+# for every tile at once, and any number of agents can share it: to get to
+# the nearest source, just keep stepping to the neighbor with the lowest
+# distance.
+#
+# Fields are cached by their sources and extra costs, and thrown away
+# whenever grid.wall_version changes (like the VisibilityTable).
+import heapq
+import threading
+from array import array
+from collections import OrderedDict, deque
+from math import inf
+from typing import FrozenSet, Iterable, List, Optional, Sequence, Tuple
+
+from models.bucket_queue import BucketQueue
+from models.cost_layers import CostField
+from models.grid_node import GridNode
+from models.resumable import finish
+
+# Multi-source BFS over the tiles in `within` (all tiles if None), starting
+# from every tile set in `seeds`. Both are bytes-like masks indexed like the
+# grid. Every tile is queued at most once.
+# Returns the number of steps from the nearest seed per tile, or inf for
+# tiles that can't be reached (including everything outside `within`).
+def distance_transform(adjacency, seeds, within=None) -> List[float]:
+    return finish(distance_transform_steps(adjacency, seeds, within))
+
+# Same as distance_transform(), as a resumable job (see resumable.py) that
+# stops after every `chunk` tiles it takes off the queue.
+def distance_transform_steps(adjacency, seeds, within=None, chunk: int = 1024):
+    dist = [inf] * len(adjacency)
+    queue = deque(i for i, seed in enumerate(seeds) if seed and (within is None or within[i]))
+    for i in queue:
+        dist[i] = 0
+    while queue:
+        for _ in range(min(chunk, len(queue))):
+            current = queue.popleft()
+            d = dist[current] + 1
+            for neighbor in adjacency[current]:
+                if dist[neighbor] == inf and (within is None or within[neighbor]):
+                    dist[neighbor] = d
+                    queue.append(neighbor)
+        yield
+    return dist
+
+
+class DistanceField:
+    def __init__(self, grid, dist: array, wall_sources: FrozenSet[int] = frozenset()):
+        self.grid = grid
+        # Distance per tile index, inf where no source can reach.
+        self.dist = dist
+        # Sources inside walls, like an NPC that's stuck in one. You can step
+        # out of a wall but not into one, so path_from() has to look for these.
+        self.wall_sources = wall_sources
+
+    def __getitem__(self, index: int) -> float:
+        return self.dist[index]
+
+    def distance_to(self, x: int, y: int) -> float:
+        return self.dist[y * self.grid.size + x]
+
+    def reachable(self, x: int, y: int) -> bool:
+        return self.dist[y * self.grid.size + x] != inf
+
+    # Walks downhill from the given tile to the nearest source. This is the
+    # shortest path from that source to the tile, backwards.
+    # Returns an in-order list of nodes like Pathfinder.find_path(), or an
+    # empty list if no source can be reached.
+    def path_from(self, start: Tuple[int, int]) -> List[GridNode]:
+        grid = self.grid
+        dist = self.dist
+        current = start[1] * grid.size + start[0]
+        if dist[current] == inf:
+            return []
+        adjacency = grid.adjacency()
+        path = [grid.node_at(current)]
+        while dist[current] > 0:
+            step = -1
+            if self.wall_sources:
+                x, y = current % grid.size, current // grid.size
+                for neighbor in grid.neighbor_indices(x, y, wall_ok=True):
+                    if neighbor in self.wall_sources:
+                        step = neighbor # a source right next to us is as close as it gets
+                        break
+            if step == -1:
+                step = min(adjacency[current], key=dist.__getitem__)
+            current = step
+            path.append(grid.node_at(current))
+        return path
+
+
+class DistanceFields:
+    # How many fields to keep around at once.
+    MAX_FIELDS = 64
+
+    def __init__(self, grid):
+        self.grid = grid
+        self.wall_version = grid.wall_version
+        # (sources, costs key) -> field
+        self.fields: OrderedDict[Tuple[FrozenSet[int], Tuple], DistanceField] = OrderedDict()
+        self.fields_built = 0 # just a metric
+        # Use a BucketQueue instead of a heap when the costs are whole numbers.
+        self.use_buckets = False
+        # NPCs thinking on different threads share the fields.
+        self.lock = threading.Lock()
+
+    def invalidate(self) -> None:
+        with self.lock:
+            self.fields.clear()
+            self.wall_version = self.grid.wall_version
+
+    # The distance field out from the given source tiles (by flat index).
+    # `costs`: extra cost for stepping onto each tile, the same as
+    # Pathfinder.find_path() takes. Without them it's a plain BFS.
+    def field(self, sources: Iterable[int], costs: Optional[CostField] = None) -> DistanceField:
+        return finish(self.field_steps(sources, costs))
+
+    # Same as field(), as a resumable job (see resumable.py). Plain BFS
+    # fields stop every so often like distance_transform_steps(), ones with
+    # costs get built all at once.
+    def field_steps(self, sources: Iterable[int], costs: Optional[CostField] = None):
+        if self.wall_version != self.grid.wall_version:
+            self.invalidate()
+        wall_version = self.wall_version
+        if costs and not costs.any:
+            costs = None
+        key = (frozenset(sources), costs.key if costs else ())
+        with self.lock:
+            field = self.fields.get(key)
+            if field is not None:
+                self.fields.move_to_end(key)
+                return field
+        # Built without holding the lock, like VisibilityTable.row()
+        if costs is None:
+            dist = yield from self._bfs_steps(key[0])
+        elif self.use_buckets and costs.whole:
+            dist = self._dial(key[0], costs.values)
+        else:
+            dist = self._dijkstra(key[0], costs.values)
+        walls = self.grid.wall_bytes()
+        field = DistanceField(self.grid, dist, frozenset(i for i in key[0] if walls[i]))
+        if wall_version != self.grid.wall_version:
+            return field # the walls changed partway through, don't keep it
+        with self.lock:
+            self.fields[key] = field
+            self.fields_built += 1
+            if len(self.fields) > self.MAX_FIELDS:
+                self.fields.popitem(last=False)
+        return field
+
+    # Shortcut for a field with a single source tile.
+    def from_tile(self, x: int, y: int, costs: Optional[CostField] = None) -> DistanceField:
+        return self.field((y * self.grid.size + x,), costs)
+
+    def _bfs_steps(self, sources: FrozenSet[int], chunk: int = 1024):
+        adjacency = self.grid.adjacency()
+        dist = array('d', [inf]) * len(adjacency)
+        for i in sources:
+            dist[i] = 0
+        queue = deque(sources)
+        while queue:
+            for _ in range(min(chunk, len(queue))):
+                current = queue.popleft()
+                d = dist[current] + 1
+                for neighbor in adjacency[current]:
+                    if dist[neighbor] == inf:
+                        dist[neighbor] = d
+                        queue.append(neighbor)
+            yield
+        return dist
+
+    def _dijkstra(self, sources: FrozenSet[int], costs: Sequence[float]) -> array:
+        adjacency = self.grid.adjacency()
+        dist = array('d', [inf]) * len(adjacency)
+        for i in sources:
+            dist[i] = 0
+        queue = [(0, i) for i in sources]
+        heapq.heapify(queue)
+        while queue:
+            d, current = heapq.heappop(queue)
+            if d > dist[current]:
+                continue # outdated entry
+            for neighbor in adjacency[current]:
+                m_dist = d + 1 + costs[neighbor]
+                if m_dist < dist[neighbor]:
+                    dist[neighbor] = m_dist
+                    heapq.heappush(queue, (m_dist, neighbor))
+        return dist
+
+    # Same as _dijkstra(), with a BucketQueue.
+    def _dial(self, sources: FrozenSet[int], costs: Sequence[int]) -> array:
+        adjacency = self.grid.adjacency()
+        dist = array('d', [inf]) * len(adjacency)
+        queue = BucketQueue()
+        for i in sources:
+            dist[i] = 0
+            queue.push(0, i)
+        while queue:
+            d, current = queue.pop()
+            if d > dist[current]:
+                continue # outdated entry
+            for neighbor in adjacency[current]:
+                m_dist = d + 1 + costs[neighbor]
+                if m_dist < dist[neighbor]:
+                    dist[neighbor] = m_dist
+                    queue.push(m_dist, neighbor)
+        return dist
@@ -0,0 +1,149 @@
+# Field of view by shadowcasting.
+#
+# Grid.is_wall_between() draws a Bresenham line between two tiles and checks
+# every tile on it. Doing that for every tile on the map is a lot of repeated
+# work, so instead this sweeps outwards from the origin one column at a time
+# (in each of the 8 octants) and keeps track of which slopes are in shadow.
+#
+# It gives exactly the same answer as is_wall_between(). In an octant where
+# the major axis goes 0..A and the minor axis 0..B (B <= A), the Bresenham
+# line to the tile (A, B) visits exactly one tile in each column i, at row
+# round(i * B / A). The rounding is "half down" when walking away from the
+# origin and "half up" when walking towards it. So a wall at (i, j) is hit
+# by every line whose slope B / A rounds to j in column i, which is a slope
+# interval of width 1 / i around j / i. Those intervals are the shadows.
+#
+# Slopes are kept as floats. Every slope here is a fraction with a small
+# denominator (at most 2 * grid size), so floats compare them exactly.
+from bisect import bisect_left, bisect_right
+from typing import Tuple
+
+# (x sign, y sign, is the major axis y?)
+OCTANTS = [
+    (sx, sy, swap) for swap in (False, True) for sx in (1, -1) for sy in (1, -1)
+]
+
+# A sorted list of non-overlapping slope intervals that are in shadow.
+# Going away from the origin the intervals are (lo, hi], going towards the
+# origin they're [lo, hi). That's the rounding difference mentioned above.
+class _Shadows:
+    def __init__(self, incoming: bool):
+        self.incoming = incoming
+        self.los = []
+        self.his = []
+
+    # Index of the interval that contains slope s, or -1
+    def find(self, s: float) -> int:
+        if self.incoming:
+            k = bisect_right(self.los, s) - 1
+            return k if k >= 0 and s < self.his[k] else -1
+        k = bisect_left(self.los, s) - 1
+        return k if k >= 0 and s <= self.his[k] else -1
+
+    def contains(self, s: float) -> bool:
+        return self.find(s) != -1
+
+    def add(self, lo: float, hi: float) -> None:
+        los, his = self.los, self.his
+        start = bisect_left(los, lo)
+        # Merge with the neighbours that overlap or touch this interval
+        if start > 0 and his[start - 1] >= lo:
+            start -= 1
+        end = start
+        while end < len(los) and los[end] <= hi:
+            end += 1
+        if end > start:
+            lo = min(lo, los[start])
+            hi = max(hi, his[end - 1])
+        los[start:end] = [lo]
+        his[start:end] = [hi]
+
+    # True once the whole octant (slopes 0 to 1) is dark.
+    def covers_octant(self) -> bool:
+        k = self.find(0.0)
+        return k != -1 and (self.his[k] > 1.0 if self.incoming else self.his[k] >= 1.0)
+
+    # Yields (lo, hi) slope ranges between 0 and 1 that aren't fully in shadow.
+    # The end points may or may not be lit, callers are expected to check.
+    def gaps(self):
+        lo = 0.0
+        for s_lo, s_hi in zip(self.los, self.his):
+            if s_hi < 0.0:
+                continue
+            if s_lo > 1.0:
+                break
+            if s_lo >= lo:
+                yield (lo, s_lo)
+            lo = max(lo, s_hi)
+        if lo <= 1.0:
+            yield (lo, 1.0)
+
+
+# Computes which tiles can see / be seen from `origin`.
+# `walls` is a bytes-like object with a nonzero byte for each wall tile,
+# indexed by y * size + x.
+# When `incoming` is False, tile T is marked visible when
+# is_wall_between(origin, T) is False. When it's True, it's marked visible
+# when is_wall_between(T, origin) is False.
+# Returns a bytearray with a 1 for each visible tile.
+def shadowcast(walls, size: int, origin: Tuple[int, int], incoming: bool = False) -> bytearray:
+    ox, oy = origin
+    visible = bytearray(size * size)
+    if not (0 <= ox < size and 0 <= oy < size):
+        return visible
+    visible[oy * size + ox] = 1
+    # A line starting inside a wall is always blocked
+    if not incoming and walls[oy * size + ox]:
+        return visible
+    for sx, sy, swap in OCTANTS:
+        _cast_octant(walls, size, ox, oy, sx, sy, swap, incoming, visible)
+    return visible
+
+
+def _cast_octant(walls, size, ox, oy, sx, sy, swap, incoming, visible) -> None:
+    # How far we can go along each axis before leaving the grid
+    reach_x = size - 1 - ox if sx > 0 else ox
+    reach_y = size - 1 - oy if sy > 0 else oy
+    if swap:
+        max_i, max_j = reach_y, reach_x
+        # tile index = origin + i * step_i + j * step_j
+        step_i, step_j = sy * size, sx
+    else:
+        max_i, max_j = reach_x, reach_y
+        step_i, step_j = sx, sy * size
+    origin_index = oy * size + ox
+    shadows = _Shadows(incoming)
+    for i in range(1, max_i + 1):
+        # Work out which rows of this column aren't already in shadow. A
+        # tile's own shadow spans (j - 0.5) / i to (j + 0.5) / i, so include
+        # anything that overlaps a gap (plus a row of slack for rounding).
+        rows = []
+        for g_lo, g_hi in shadows.gaps():
+            j_lo = max(0, int(i * g_lo - 0.5) - 1)
+            j_hi = min(max_j, i, int(i * g_hi + 0.5) + 1)
+            if rows and j_lo <= rows[-1][1]:
+                rows[-1] = (rows[-1][0], max(rows[-1][1], j_hi))
+            elif j_lo <= j_hi:
+                rows.append((j_lo, j_hi))
+        if not rows:
+            break
+        column = origin_index + i * step_i
+        new_shadows = []
+        for j_lo, j_hi in rows:
+            for j in range(j_lo, j_hi + 1):
+                if walls[column + j * step_j]:
+                    new_shadows.append(((2 * j - 1) / (2 * i), (2 * j + 1) / (2 * i)))
+        # Going towards the origin, the line to a tile includes the tile
+        # itself, so this column's walls count. Going away, they don't.
+        if incoming:
+            for lo, hi in new_shadows:
+                shadows.add(lo, hi)
+        for j_lo, j_hi in rows:
+            for j in range(j_lo, j_hi + 1):
+                if not shadows.contains(j / i):
+                    visible[column + j * step_j] = 1
+        if not incoming:
+            for lo, hi in new_shadows:
+                shadows.add(lo, hi)
+        if shadows.covers_octant():
+            break
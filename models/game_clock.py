@@ -0,0 +1,29 @@
+# The game's clock: how many seconds of game time have passed.
+# Anything that needs to know the time (like the seeker remembering when
+# it last saw the hider) asks this instead of the computer's clock, and the
+# game loop moves it along by each frame's dt. The simulation moves it in
+# fixed steps, so rounds run as fast as the computer can go and come out
+# the same on a fast machine as on a slow one.
+import math
+
+
+class GameClock:
+    def __init__(self, start: float = 0.0):
+        self.time = start
+
+    def now(self) -> float:
+        return self.time
+
+    def advance(self, dt: float) -> None:
+        self.time += dt
+
+
+# How many more times `timer` can go up by `dt` and still be under `limit`,
+# going up all at once (timer + dt * steps).
+def steps_under(timer: float, dt: float, limit: float) -> int:
+    if dt <= 0:
+        return 0
+    steps = max(0, math.ceil((limit - timer) / dt) - 1)
+    while steps > 0 and timer + dt * steps >= limit: # in case it rounded up
+        steps -= 1
+    return steps
@@ -1,36 +1,110 @@
+import random
 from typing import List, Optional, Tuple
-import pygame
 
 from constants import *
+from models.connected_components import label_components_steps
+from models.cost_layers import CostLayers
+from models.distance_field import DistanceFields, distance_transform_steps
+from models.field_of_view import shadowcast
+from models.game_clock import GameClock
 from models.grid_node import GridNode
+from models.stench_field import StenchField
+from models.grid_storage import (
+    HAS_NUMPY, SEEN_BY_HIDER, SEEN_BY_SEEKER, WALL, make_storage
+)
+from models.resumable import finish
+from models.visibility_table import ViewCache, VisibilityTable
 
 # A grid has a bunch of gridnodes and draws them on the screen and all that.
 # "Tile", "cell", and "gridnode" all refer to the same thing, sorry.
+# The tile data itself lives in flat arrays (self.storage), and GridNodes
+# are created on demand as views into it. Tile (x, y) is at index y * size + x.
 class Grid:
-    def __init__(self, size: int, display_size: int):
+    # `clock`: the GameClock to keep time with, a new one if not given.
+    def __init__(self, size: int, display_size: int, use_numpy: bool = HAS_NUMPY, clock: Optional[GameClock] = None):
         self.size = size
         self.display_size = display_size
         self.tile_size = display_size / size
-        # Fill the grid with empty gridnodes
-        self.nodes: List[List[GridNode]] = []
-        self.tiles_changed = False  # Flag to track if tiles have changed
-        for y in range(size):
-            row = []
-            for x in range(size):
-                row.append(GridNode(x, y))
-            self.nodes.append(row)
+        # All tiles start out empty
+        self.storage = make_storage(size, use_numpy)
+        # Goes up by one every time a wall is added or removed. Anything that
+        # caches stuff based on the walls can compare against this.
+        self.wall_version = 0
+        # Game time, for the stench and the NPCs. See advance_time().
+        self.clock = clock or GameClock()
+        # Random numbers for the game (like where NPCs start). Seed this to
+        # play a round exactly the same again.
+        self.random = random.Random()
+        # The seeker's stench and the trail it leaves, see stench_field.py.
+        # Its version goes up whenever the stench changes (see stench_version).
+        self.stench = StenchField(self, half_life=STENCH_HALF_LIFE)
+        # (seeker tile, wall_version) seen_by_seeker was last worked out for,
+        # so anything based on it can tell when it's changed.
+        self.seeker_view = None
+        # What every tile can see, filled in as needed.
+        self.visibility = VisibilityTable(self)
+        # Shared distance fields, see distance_field.py
+        self.distances = DistanceFields(self)
+        # Shared results worked out from what the seeker can see
+        self.views = ViewCache()
+        # Extra path costs that NPCs can mix together, see cost_layers.py.
+        # "stench" is the stench strength, 1 right around the seeker.
+        self.costs = CostLayers(self)
+        self.costs.add_layer(
+            "stench",
+            build=lambda: self.stench.strength,
+            source_version=lambda: self.stench_version
+        )
+        self._adjacency = None # see adjacency()
+        self._wall_bytes = None # see wall_bytes()
         self.nodes_gotten = 0 # just a metric
 
-    # If you iterate over all the nodes using self.nodes, you'll need a nested
-    # for loop. Alternatively, you can use this flattening to iterate with
-    # one for loop
+    # Iterates over every node in the grid, row by row.
     def all_nodes(self) -> List[GridNode]:
-        self.nodes_gotten += GRID_SIZE * GRID_SIZE
-        return [node for row in self.nodes for node in row]
+        self.nodes_gotten += self.size * self.size
+        return [GridNode(self, x, y) for y in range(self.size) for x in range(self.size)]
+
+    # Gets the node for a flat array index (see the comment above the class)
+    def node_at(self, index: int) -> GridNode:
+        return GridNode(self, index % self.size, index // self.size)
+
+    # Quick wall check that skips making a GridNode.
+    def is_wall(self, x: int, y: int) -> bool:
+        return self.storage.get(WALL, y * self.size + x)
+
+    # The wall layout as bytes, 1 for a wall and 0 otherwise, indexed like
+    # the storage. Cached until the walls change.
+    def wall_bytes(self) -> bytes:
+        if self._wall_bytes is None or self._wall_bytes[0] != self.wall_version:
+            self._wall_bytes = (self.wall_version, self.storage.mask_bytes(WALL))
+        return self._wall_bytes[1]
+
+    # The tile indices that are a wall now but weren't in `old` (an earlier
+    # wall_bytes()), or the other way around. Whole rows are compared first
+    # since most of them won't have changed.
+    def changed_walls(self, old: bytes) -> List[int]:
+        walls = self.wall_bytes()
+        size = self.size
+        changed = []
+        for row in range(0, size * size, size):
+            if walls[row:row + size] != old[row:row + size]:
+                changed += [i for i in range(row, row + size) if walls[i] != old[i]]
+        return changed
     
     # Returns true if there is a solid tile between the two tile positions
     # on the grid. Used for calculating visibility.
+    # Looks the answer up in the visibility table. See _trace_wall_between()
+    # for the actual rules.
     def is_wall_between(self, pos0: Tuple[int, int], pos1: Tuple[int, int]):
+        if not self.is_valid_position(*pos0) or not self.is_valid_position(*pos1):
+            return self._trace_wall_between(pos0, pos1)
+        self.nodes_gotten += 1
+        a = pos0[1] * self.size + pos0[0]
+        b = pos1[1] * self.size + pos1[0]
+        return not self.visibility.can_see(a, b)
+
+    # Walks the line between the two tiles to see if there's a wall on it.
+    def _trace_wall_between(self, pos0: Tuple[int, int], pos1: Tuple[int, int]):
         x0, y0 = pos0
         x1, y1 = pos1
         # Really, this is just a line drawing algorithm (Bresenham's)
@@ -42,8 +116,8 @@ class Grid:
         sy = 1 if y0 < y1 else -1
         err = dx - dy
         while (x0, y0) != (x1, y1):
-            node = self.get_node(x0, y0)
-            if node is not None and node.is_wall:
+            self.nodes_gotten += 1
+            if self.is_valid_position(x0, y0) and self.is_wall(x0, y0):
                 return True
             e2 = 2 * err
             if e2 > -dy:
@@ -64,7 +138,7 @@ class Grid:
         self.nodes_gotten += 1
         if not self.is_valid_position(x, y):
             return None
-        return self.nodes[y][x]
+        return GridNode(self, x, y)
     
     # Changes the tile at the given cell-coordinates to
     # be a wall or not a wall.
@@ -72,36 +146,116 @@ class Grid:
     def toggle_wall(self, x: int, y: int) -> bool:
         if not self.is_valid_position(x, y):
             return False
-        node = self.nodes[y][x]
-        node.is_wall = not node.is_wall
-        self.tiles_changed = True  # Mark tiles as changed
+        return self.set_wall(x, y, not self.is_wall(x, y))
+
+    # Makes the tile at the given cell-coordinates a wall or not a wall.
+    # Returns true if successful, false if it couldn't be done.
+    def set_wall(self, x: int, y: int, is_wall: bool) -> bool:
+        if not self.is_valid_position(x, y):
+            return False
+        self.storage.set(WALL, y * self.size + x, is_wall)
+        self.wall_version += 1
+        self._patch_adjacency(x, y)
         return True
     
     # Returns the nodes surrounding the given node. 
     # `wall_ok`: When true, returns includes wall tiles as neighbors
     def get_neighbors(self, node: GridNode, wall_ok: bool = False) -> List[GridNode]:
+        return [self.node_at(i) for i in self.neighbor_indices(node.x, node.y, wall_ok)]
+
+    # Same as get_neighbors(), but gives flat indices instead of GridNodes.
+    def neighbor_indices(self, x: int, y: int, wall_ok: bool = False) -> List[int]:
         neighbors = []
+        size = self.size
+        is_wall = self.is_wall
         # Including diagonals (8 directions)
         for dx in [-1, 0, 1]:
             for dy in [-1, 0, 1]:
                 if dx == 0 and dy == 0: # the center is not a neighbor
                     continue
-                nx, ny = node.x + dx, node.y + dy
-                if self.is_valid_position(nx, ny):
-                    neighbor = self.nodes[ny][nx]
-                    if not wall_ok and neighbor.is_wall:
+                nx, ny = x + dx, y + dy
+                if 0 <= nx < size and 0 <= ny < size:
+                    if not wall_ok and is_wall(nx, ny):
                         continue
                     # tricky part: don't want paths to go through diagonal walls.
+                    # (nx, y) and (x, ny) are always on the grid here.
                     if dx != 0 and dy != 0 \
-                    and self.get_node(node.x + dx, node.y) and self.get_node(node.x, node.y + dy) \
-                    and self.get_node(node.x + dx, node.y).is_wall and self.get_node(node.x, node.y + dy).is_wall:
+                    and is_wall(nx, y) and is_wall(x, ny):
                         # _X_
                         # X X
                         # _X_
                         continue
-                    neighbors.append(neighbor)
+                    neighbors.append(ny * size + nx)
         return neighbors
 
+    # A mask of the tiles that have a neighbor set in `mask` (a bytes-like
+    # mask indexed like the grid). "Neighbor" follows get_neighbors() with
+    # wall_ok=True, so diagonals squeezed between two walls don't count.
+    # Only looks around the set tiles, so sparse masks are cheap.
+    def touching(self, mask) -> bytearray:
+        return finish(self.touching_steps(mask))
+
+    # The *_steps() versions are resumable jobs (see resumable.py) that give
+    # the same answer.
+    # This one stops after every row.
+    def touching_steps(self, mask):
+        size = self.size
+        walls = self.wall_bytes()
+        result = bytearray(size * size)
+        for y in range(size):
+            row = y * size
+            for x in range(size):
+                if not mask[row + x]:
+                    continue
+                for ny in range(max(0, y - 1), min(size, y + 2)):
+                    for nx in range(max(0, x - 1), min(size, x + 2)):
+                        if nx != x and ny != y and walls[row + nx] and walls[ny * size + x]:
+                            continue # the same rule as in neighbor_indices()
+                        if nx != x or ny != y:
+                            result[ny * size + nx] = 1
+            yield
+        return result
+
+    # How many steps every tile is from the nearest tile set in `seeds`,
+    # only walking over tiles set in `within` (everywhere if None).
+    # Uses the same moves as the pathfinder. Unreachable tiles get inf.
+    def distance_transform(self, seeds, within=None) -> List[float]:
+        return finish(self.distance_transform_steps(seeds, within))
+
+    def distance_transform_steps(self, seeds, within=None):
+        return distance_transform_steps(self.adjacency(), seeds, within)
+
+    # Splits the tiles set in `mask` into groups you can walk between without
+    # leaving the mask. See connected_components.py.
+    # Returns (labels, sizes): a group number per tile (-1 if not in the
+    # mask) and the size of each group.
+    def label_components(self, mask) -> Tuple[List[int], List[int]]:
+        return finish(self.label_components_steps(mask))
+
+    def label_components_steps(self, mask):
+        return label_components_steps(self.adjacency(), mask)
+
+    # For every tile index, a tuple of the tile indices you can walk to from
+    # it (the same as get_neighbors() with wall_ok=False). Searches use this
+    # so they don't have to work out neighbors over and over.
+    # It's built the first time it's needed and patched when walls change.
+    def adjacency(self) -> List[Tuple[int, ...]]:
+        if self._adjacency is None:
+            size = self.size
+            self._adjacency = [
+                tuple(self.neighbor_indices(x, y)) for y in range(size) for x in range(size)
+            ]
+        return self._adjacency
+
+    # A wall at (x, y) can only change the neighbors of the tiles right
+    # around it, so only those need redoing.
+    def _patch_adjacency(self, x: int, y: int) -> None:
+        if self._adjacency is None:
+            return
+        for ny in range(max(0, y - 1), min(self.size, y + 2)):
+            for nx in range(max(0, x - 1), min(self.size, x + 2)):
+                self._adjacency[ny * self.size + nx] = tuple(self.neighbor_indices(nx, ny))
+
     # Converts a world-space or tile coordinate to where it is on the screen.
     def grid_to_screen(self, grid_x: float, grid_y: float) -> Tuple[float, float]:
         screen_x = grid_x * self.tile_size
@@ -110,9 +264,9 @@ class Grid:
     
     # set all nodes to non-walls
     def clear(self):
-        for row in self.nodes:
-            for node in row:
-                node.is_wall = False
+        self.storage.fill(WALL, False)
+        self.wall_version += 1
+        self._adjacency = None
 
     # Converts screen coordinates to a coordinate of a tile on the grid.
     # Good for finding out where you clicked or something.
@@ -124,76 +278,63 @@ class Grid:
         grid_y = max(0, min(grid_y, self.size - 1))
         return (grid_x, grid_y)
     
-    # Sets stench to true in the given radius, false otherwise
-    def stink_it(self, x, y, radius) -> None:
-        for row in self.nodes:
-            for node in row:
-                node.stench = False
-        for dx in range(-radius, radius + 1):
-            for dy in range(-radius, radius + 1):
-                nx, ny = x + dx, y + dy
-                if self.is_valid_position(nx, ny):
-                    distance = (dx**2 + dy**2)**0.5  # Euclidean distance
-                    if distance <= radius:
-                        node = self.get_node(nx, ny)
-                        if node:
-                            node.stench = True
+    # Uses `other`'s tables for everything that only depends on the walls
+    # (visibility, distance fields, seeker views) instead of filling in its
+    # own. For lots of games on the same level (see batch_runner.py). Both
+    # grids need the same walls, and they shouldn't change afterwards.
+    def share_tables(self, other: "Grid") -> None:
+        self.visibility = other.visibility
+        self.distances = other.distances
+        self.views = other.views
+
+    # Lets dt seconds of game time pass. The game loop calls this once a frame.
+    def advance_time(self, dt: float) -> None:
+        self.clock.advance(dt)
+        self.stench.catch_up() # the trail fades
+
+    # Goes up whenever the stench changes, like wall_version for walls.
+    @property
+    def stench_version(self) -> int:
+        return self.stench.version
+
+    # Sets the stench on one tile.
+    def set_stench(self, x: int, y: int, value: bool) -> None:
+        self.stench.set(x, y, value)
+
+    # Full stench in the given radius around (x, y). Wherever `source`
+    # stunk before fades out (see stench_field.py).
+    def stink_it(self, x, y, radius, source=None) -> None:
+        self.stench.stink(x, y, radius, source)
 
     @staticmethod
     def add_colors(color1: Tuple[int, int, int], color2: Tuple[int, int, int]) -> Tuple[int, int, int]:
         return tuple(min(c1 + c2, 255) for c1, c2 in zip(color1, color2))
     
-    # In pygame, a "surface" is like a render texture in other frameworks/engines.
-    # If partial is true, then tiles will either be white if in view of seeker, or 
-    # black otherwise. That's meant for human seeker to not have unfair visibility.
-    def draw(self, surface: pygame.Surface, partial: bool):
-        # tiles
-        for y in range(self.size):
-            for x in range(self.size):
-                node = self.nodes[y][x]
-                if partial:
-                    if node.seen_by_seeker:
-                        color = (190, 190, 190)
-                    else:
-                        color = (0, 0, 0)  # Black for unseen tiles
-                    if node.is_wall:
-                        color = (80, 60, 190)
-                else:
-                    if node.is_wall:
-                        color = WALL_TILE_COLOR
-                    else:
-                        color = EMPTY_TILE_COLOR
-                    if node.seen_by_seeker:
-                        color = self.add_colors(color, (0, 0, 50))
-                    if node.seen_by_hider:
-                        color = self.add_colors(color, (50, 0, 0))
-                
-                rect = pygame.Rect(
-                    *self.grid_to_screen(x, y),
-                    self.tile_size,
-                    self.tile_size
-                )
-                pygame.draw.rect(surface, color, rect)
-        # grid lines
-        for i in range(self.size + 1):
-            pos = i * self.tile_size
-            pygame.draw.line(
-                surface, GRID_LINE_COLOR,
-                (0, pos + UI_HEIGHT),
-                (self.display_size, pos + UI_HEIGHT)
-            )
-            pygame.draw.line(
-                surface, GRID_LINE_COLOR,
-                (pos, UI_HEIGHT),
-                (pos, self.display_size + UI_HEIGHT)
-            )
+    # Finds every tile that can see (or be seen from) the origin in one go.
+    # Same rules as is_wall_between(), see field_of_view.py for how.
+    # `incoming` False: tiles T where is_wall_between(origin, T) is false.
+    # `incoming` True: tiles T where is_wall_between(T, origin) is false.
+    # Returns a bytearray with a 1 at the index of every visible tile.
+    def compute_fov(self, origin: Tuple[int, int], incoming: bool = False) -> bytearray:
+        return shadowcast(self.wall_bytes(), self.size, origin, incoming)
+
+    # Sets seen_by_seeker (and seen_by_hider if a hider position is given) on
+    # every tile. A tile is seen if there's no wall between it and the npc.
+    def update_visibility(self, seeker_pos: Tuple[int, int], hider_pos: Optional[Tuple[int, int]] = None) -> None:
+        seeker_index = seeker_pos[1] * self.size + seeker_pos[0]
+        self.storage.set_mask(SEEN_BY_SEEKER, self.visibility.mask(seeker_index, incoming=True))
+        self.seeker_view = (tuple(seeker_pos), self.wall_version)
+        if hider_pos is not None:
+            hider_index = hider_pos[1] * self.size + hider_pos[0]
+            self.storage.set_mask(SEEN_BY_HIDER, self.visibility.mask(hider_index, incoming=True))
 
     def get_visible_tiles(self, seeker_pos: tuple[int, int]) -> set[tuple[int, int]]:
     # simple LOS checker or vision radius
-        visible = set()
-        for x in range(self.size):
-            for y in range(self.size):
-                if not self.is_wall_between(seeker_pos, (x, y)):
-                    if not self.get_node(x, y).is_wall:
-                        visible.add((x, y))
-        return visible
\ No newline at end of file
+        visible = self.visibility.mask(seeker_pos[1] * self.size + seeker_pos[0])
+        walls = self.wall_bytes()
+        size = self.size
+        return {
+            (i % size, i // size)
+            for i in range(size * size)
+            if visible[i] and not walls[i]
+        }
\ No newline at end of file
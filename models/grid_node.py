@@ -1,41 +1,62 @@
 # These are nodes that the path finding algos will traverse.
+# A GridNode doesn't hold any data itself, it's a lightweight view of one
+# tile's slot in the grid's arrays (see grid_storage.py). That means two
+# GridNode objects for the same tile always agree with each other.
 from typing import Tuple
 
+from models.grid_storage import SEEN_BY_HIDER, SEEN_BY_SEEKER, STENCH, WALL
+
+# Makes a property that reads/writes one of the grid's flag arrays.
+def _flag_property(flag: int) -> property:
+    def getter(self) -> bool:
+        return self.grid.storage.get(flag, self.index)
+    def setter(self, value: bool) -> None:
+        self.grid.storage.set(flag, self.index, value)
+    return property(getter, setter)
+
 class GridNode:
-    def __init__(self, x: int, y: int, is_wall: bool = False):
+    __slots__ = ("grid", "x", "y", "index")
+
+    def __init__(self, grid, x: int, y: int):
+        self.grid = grid
         self.x = x
         self.y = y
-        self.is_wall = is_wall
-        self.reset_path_data()
-        self.seen_by_hider = True # false if obstructed by wall
-        self.seen_by_seeker = True # false if obstructed by wall
-        self.stench = False
-    
-    def reset_path_data(self):
-        self.g_score = 99999 # The path cost
-        self.h_score = 0 # The heuristic
-        # During pathfinding, each node will know which node comes before
-        # it in the path to the goal.
-        self.came_from = None 
-
-    def get_f_score(self):
-        return self.g_score + self.h_score
-    
+        self.index = y * grid.size + x
+
+    # Walls go through the grid so it knows the layout changed
+    @property
+    def is_wall(self) -> bool:
+        return self.grid.storage.get(WALL, self.index)
+
+    @is_wall.setter
+    def is_wall(self, value: bool) -> None:
+        self.grid.set_wall(self.x, self.y, value)
+
+    # Stench goes through the grid too so stench_version stays right
+    @property
+    def stench(self) -> bool:
+        return self.grid.storage.get(STENCH, self.index)
+
+    @stench.setter
+    def stench(self, value: bool) -> None:
+        self.grid.set_stench(self.x, self.y, value)
+
+    seen_by_hider = _flag_property(SEEN_BY_HIDER) # false if obstructed by wall
+    seen_by_seeker = _flag_property(SEEN_BY_SEEKER) # false if obstructed by wall
+
     def get_position(self) -> Tuple[int, int]:
         return (self.x, self.y)
 
-    # Lets you compare two GridNodes with the < symbol,
-    # "lt" stands for "less than".
-    def __lt__(self, other):
-        return self.get_f_score() < other.get_f_score()
-
     # Lets you compare two GridNodes with the == symbol,
     # "eq" is short for "equals".
     def __eq__(self, other):
         if not isinstance(other, GridNode):
             return False
         return self.x == other.x and self.y == other.y
-    
+
     # This gets used when you put a GridNode into a set or something.
     def __hash__(self):
-        return hash((self.x, self.y))
\ No newline at end of file
+        return hash((self.x, self.y))
+
+    def __repr__(self):
+        return f"GridNode({self.x}, {self.y})"
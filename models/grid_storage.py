@@ -0,0 +1,101 @@
+# Struct-of-arrays storage for the grid.
+# Instead of every GridNode carrying its own attributes, all the per-tile
+# data lives in flat arrays here, indexed by `y * size + x`. GridNodes are
+# just little views into these arrays.
+#
+# NumPy is optional. With it, every flag is its own contiguous bool array
+# (which makes whole-grid operations easy to vectorize). Without it, the
+# flags are bit-packed into a single bytearray, one byte per tile.
+try:
+    import numpy as np
+except ImportError:  # numpy is optional
+    np = None
+
+HAS_NUMPY = np is not None
+
+# Bit flags for the per-tile booleans.
+WALL = 1
+STENCH = 2
+SEEN_BY_SEEKER = 4
+SEEN_BY_HIDER = 8
+ALL_FLAGS = (WALL, STENCH, SEEN_BY_SEEKER, SEEN_BY_HIDER)
+
+# Tiles start out empty and visible to everyone.
+DEFAULT_FLAGS = SEEN_BY_SEEKER | SEEN_BY_HIDER
+
+
+class NumpyGridStorage:
+    def __init__(self, size: int):
+        self.size = size
+        self.count = size * size
+        self.flags = {
+            flag: np.full(self.count, bool(DEFAULT_FLAGS & flag))
+            for flag in ALL_FLAGS
+        }
+
+    def get(self, flag: int, i: int) -> bool:
+        return bool(self.flags[flag][i])
+
+    def set(self, flag: int, i: int, value: bool) -> None:
+        self.flags[flag][i] = value
+
+    def fill(self, flag: int, value: bool) -> None:
+        self.flags[flag].fill(value)
+
+    # The whole flag layer as a flat bool array. A copy, like
+    # PackedGridStorage.mask(), so writing to it or keeping it around
+    # doesn't touch the grid on either backend.
+    def mask(self, flag: int):
+        return self.flags[flag].copy()
+
+    # The flag layer as bytes, 1 where it's set and 0 where it isn't.
+    def mask_bytes(self, flag: int) -> bytes:
+        return self.flags[flag].tobytes()
+
+    # Overwrites the flag layer from a bytes-like object of 0s and 1s.
+    def set_mask(self, flag: int, mask) -> None:
+        self.flags[flag][:] = np.frombuffer(mask, dtype=np.uint8)
+
+
+class PackedGridStorage:
+    def __init__(self, size: int):
+        self.size = size
+        self.count = size * size
+        self.bits = bytearray([DEFAULT_FLAGS]) * self.count
+
+    def get(self, flag: int, i: int) -> bool:
+        return bool(self.bits[i] & flag)
+
+    def set(self, flag: int, i: int, value: bool) -> None:
+        if value:
+            self.bits[i] |= flag
+        else:
+            self.bits[i] &= ~flag
+
+    def fill(self, flag: int, value: bool) -> None:
+        if value:
+            self.bits = bytearray(b | flag for b in self.bits)
+        else:
+            self.bits = bytearray(b & ~flag for b in self.bits)
+
+    # The whole flag layer as a flat list of bools (a copy, see
+    # NumpyGridStorage.mask()).
+    def mask(self, flag: int):
+        return [bool(b & flag) for b in self.bits]
+
+    # The flag layer as bytes, 1 where it's set and 0 where it isn't.
+    def mask_bytes(self, flag: int) -> bytes:
+        return bytes(1 if b & flag else 0 for b in self.bits)
+
+    # Overwrites the flag layer from a bytes-like object of 0s and 1s.
+    def set_mask(self, flag: int, mask) -> None:
+        self.bits = bytearray(
+            (b | flag) if m else (b & ~flag) for b, m in zip(self.bits, mask)
+        )
+
+
+# Picks the fastest backend available.
+def make_storage(size: int, use_numpy: bool = HAS_NUMPY):
+    if use_numpy and HAS_NUMPY:
+        return NumpyGridStorage(size)
+    return PackedGridStorage(size)
@@ -0,0 +1,13 @@
+# Work that can be done a bit at a time.
+# A resumable job is a generator that yields whenever it's at a good spot to
+# stop, and returns its result when it's done. Jobs can run other jobs with
+# `result = yield from other_job`. Whoever runs it decides how much to do at
+# once by how often they call next() on it (see Hider.work_on_analysis()).
+
+# Runs a job all the way through and returns its result.
+def finish(job):
+    while True:
+        try:
+            next(job)
+        except StopIteration as done:
+            return done.value
@@ -0,0 +1,130 @@
+# The seeker's stench, as a strength from 0 to 1 on every tile.
+# Tiles within a seeker's stink radius smell at full strength. Once the
+# seeker moves on, the tiles it left behind fade out over time (halving
+# every `half_life` seconds), so it leaves a trail the hider can avoid.
+#
+# Nothing here loops over the whole grid:
+# - Each stink disc is a list of offsets, worked out once per radius.
+# - When a disc moves, only the tiles entering or leaving it change.
+# - Fading only touches the tiles on the trail, and tiles that have faded
+#   below `cutoff` drop off it.
+#
+# The storage's STENCH flag is kept in sync (set wherever the strength isn't
+# 0), so GridNode.stench still works as a plain true/false.
+import math
+from array import array
+from typing import Dict, Hashable, List, Optional, Set, Tuple
+
+from models.game_clock import steps_under
+from models.grid_storage import STENCH
+
+# radius -> offsets (dx, dy) within that radius
+_disc_offsets: Dict[int, List[Tuple[int, int]]] = {}
+
+def disc_offsets(radius: int) -> List[Tuple[int, int]]:
+    offsets = _disc_offsets.get(radius)
+    if offsets is None:
+        r2 = radius * radius # compare squared distances, no sqrt needed
+        offsets = [
+            (dx, dy)
+            for dx in range(-radius, radius + 1)
+            for dy in range(-radius, radius + 1)
+            if dx * dx + dy * dy <= r2
+        ]
+        _disc_offsets[radius] = offsets
+    return offsets
+
+
+class StenchField:
+    # Fading only gets applied (and `version` only goes up for it) this
+    # often, in seconds. In between, the strengths stay put, so anything
+    # cached on the version isn't thrown away every frame.
+    DECAY_STEP = 0.5
+
+    # `half_life`: seconds for a trail to fade to half strength. None means
+    # no trail, tiles stop smelling as soon as they leave the disc.
+    # `cutoff`: a trail this faint counts as gone.
+    def __init__(self, grid, half_life: Optional[float] = None, cutoff: float = 0.1):
+        self.grid = grid
+        self.half_life = half_life
+        self.cutoff = cutoff
+        count = grid.size * grid.size
+        self.strength = array('d', bytes(8 * count)) # all 0
+        # Goes up whenever any strength changes.
+        self.version = 0
+        self.decayed_at = grid.clock.now() # the time the strengths are for
+        # Who's stinking -> (x, y, radius) and the tiles in their disc
+        self.sources: Dict[Hashable, Tuple[Tuple[int, int, int], Set[int]]] = {}
+        # How many discs each tile is in
+        self.cover = bytearray(count)
+        # Tiles that left every disc -> when they left
+        self.trail: Dict[int, float] = {}
+
+    # Fades the trail if it's been long enough since last time. Call this
+    # whenever the grid's clock moves (Grid.advance_time() does).
+    def catch_up(self) -> None:
+        if self.trail and self.grid.clock.now() - self.decayed_at >= self.DECAY_STEP:
+            self._decay()
+
+    # How many more steps of dt the clock can take before the trail fades
+    # again (see Npc.quiet_steps()).
+    def quiet_steps(self, dt: float) -> int:
+        if not self.trail:
+            return math.inf
+        return steps_under(self.grid.clock.now() - self.decayed_at, dt, self.DECAY_STEP)
+
+    def _set(self, i: int, value: float) -> None:
+        self.strength[i] = value
+        self.grid.storage.set(STENCH, i, value > 0)
+
+    def _decay(self) -> None:
+        now = self.grid.clock.now()
+        self.decayed_at = now
+        faded = []
+        for i, left_at in self.trail.items():
+            value = 0.5 ** ((now - left_at) / self.half_life)
+            if value < self.cutoff:
+                faded.append(i)
+                value = 0
+            self._set(i, value)
+        for i in faded:
+            del self.trail[i]
+        self.version += 1
+
+    # Moves `source`'s stink disc to be centered on (x, y).
+    def stink(self, x: int, y: int, radius: int, source: Hashable = None) -> None:
+        where = (x, y, radius)
+        old = self.sources.get(source)
+        if old is not None and old[0] == where:
+            return # it'd come out the same
+        size = self.grid.size
+        tiles = set()
+        for dx, dy in disc_offsets(radius):
+            nx, ny = x + dx, y + dy
+            if 0 <= nx < size and 0 <= ny < size:
+                tiles.add(ny * size + nx)
+        old_tiles = old[1] if old is not None else set()
+        self.sources[source] = (where, tiles)
+        cover = self.cover
+        for i in tiles - old_tiles: # entering
+            cover[i] += 1
+            self.trail.pop(i, None)
+            self._set(i, 1.0)
+        for i in old_tiles - tiles: # leaving
+            cover[i] -= 1
+            if cover[i]:
+                continue # still in someone else's disc
+            if self.half_life:
+                self.trail[i] = self.grid.clock.now()
+            else:
+                self._set(i, 0)
+        self.version += 1
+
+    # Sets one tile to full strength (it fades like a trail) or to nothing.
+    def set(self, x: int, y: int, value: bool) -> None:
+        i = y * self.grid.size + x
+        self.trail.pop(i, None)
+        if value and self.half_life:
+            self.trail[i] = self.grid.clock.now()
+        self._set(i, 1.0 if value else 0)
+        self.version += 1
@@ -0,0 +1,116 @@
+# Potentially visible set (PVS) table.
+# While the walls stay the same, what a tile can see never changes, so each
+# tile's field of view is computed once (the first time it's asked for) and
+# kept as a bitset: bit i is set if tile i is visible. After that, asking
+# "is there a wall between these two tiles?" is a single bit test.
+#
+# The table is thrown away whenever grid.wall_version changes, which happens
+# on every wall edit (toggle_wall, clear, set_wall, loading a level).
+import threading
+from collections import OrderedDict
+from typing import Tuple
+
+from models.grid_storage import HAS_NUMPY, np
+
+# Maps 0/1 bytes to '0'/'1' characters and back, for packing without numpy.
+_BYTES_TO_ASCII = bytes.maketrans(b"\x00\x01", b"01")
+_ASCII_TO_BYTES = bytes.maketrans(b"01", b"\x00\x01")
+
+# Packs a bytes-like object of 0s and 1s into a bitset (bit i = byte i).
+def pack_bits(mask) -> bytes:
+    if HAS_NUMPY:
+        return np.packbits(np.frombuffer(mask, dtype=np.uint8), bitorder="little").tobytes()
+    value = int(bytes(mask).translate(_BYTES_TO_ASCII)[::-1] or b"0", 2)
+    return value.to_bytes((len(mask) + 7) // 8, "little")
+
+# The opposite of pack_bits(). `count` is how many bits to unpack.
+def unpack_bits(packed: bytes, count: int) -> bytes:
+    if HAS_NUMPY:
+        bits = np.unpackbits(np.frombuffer(packed, dtype=np.uint8), count=count, bitorder="little")
+        return bits.tobytes()
+    value = int.from_bytes(packed, "little")
+    return format(value, "b").zfill(count)[::-1].encode().translate(_ASCII_TO_BYTES)
+
+def test_bit(packed: bytes, i: int) -> bool:
+    return bool(packed[i >> 3] >> (i & 7) & 1)
+
+
+class VisibilityTable:
+    # How many rows to keep around at once. A row is size * size bits, so on
+    # a 200x200 map this caps the table at about 40MB.
+    MAX_ROWS = 8192
+
+    def __init__(self, grid):
+        self.grid = grid
+        self.wall_version = grid.wall_version
+        # (origin index, incoming) -> packed row. See Grid.compute_fov() for
+        # what incoming means.
+        self.rows: OrderedDict[Tuple[int, bool], bytes] = OrderedDict()
+        self.rows_built = 0 # just a metric
+        # NPCs thinking on different threads share the table.
+        self.lock = threading.Lock()
+
+    def invalidate(self) -> None:
+        with self.lock:
+            self.rows.clear()
+            self.wall_version = self.grid.wall_version
+
+    # The bitset of tiles visible from the origin tile (by flat index).
+    def row(self, origin: int, incoming: bool = False) -> bytes:
+        if self.wall_version != self.grid.wall_version:
+            self.invalidate()
+        key = (origin, incoming)
+        with self.lock:
+            row = self.rows.get(key)
+            if row is not None:
+                self.rows.move_to_end(key)
+                return row
+        # Work it out without holding the lock. Two threads might both do
+        # it, which is fine, they'll get the same row.
+        size = self.grid.size
+        fov = self.grid.compute_fov((origin % size, origin // size), incoming)
+        row = pack_bits(fov)
+        with self.lock:
+            self.rows[key] = row
+            self.rows_built += 1
+            if len(self.rows) > self.MAX_ROWS:
+                self.rows.popitem(last=False)
+        return row
+
+    # Same as row(), but unpacked to one byte per tile.
+    def mask(self, origin: int, incoming: bool = False) -> bytes:
+        return unpack_bits(self.row(origin, incoming), self.grid.size * self.grid.size)
+
+    # True if there's no wall between tiles a and b (by flat index), going
+    # from a to b. Uses whichever of the two rows is already built.
+    def can_see(self, a: int, b: int) -> bool:
+        if self.wall_version != self.grid.wall_version:
+            self.invalidate()
+        if (a, False) not in self.rows and (b, True) in self.rows:
+            return test_bit(self.row(b, incoming=True), a)
+        return test_bit(self.row(a), b)
+
+
+# Anything worked out from just what the seeker can see, by
+# Grid.seeker_view, like the hider's layers for where it could hide.
+# Keeps the `size` most recently used. NPCs share it (maybe from different
+# threads), and so do grids that share tables (see Grid.share_tables()).
+class ViewCache(OrderedDict):
+    def __init__(self, size: int = 64):
+        super().__init__()
+        self.size = size
+        self.lock = threading.Lock()
+
+    def recall(self, key):
+        with self.lock:
+            value = self.get(key)
+            if value is not None:
+                self.move_to_end(key)
+            return value
+
+    def remember(self, key, value) -> None:
+        with self.lock:
+            self[key] = value
+            self.move_to_end(key)
+            if len(self) > self.size:
+                self.popitem(last=False)
@@ -0,0 +1,421 @@
+# Plays a batch of rounds on one level at the same time, a step of every
+# game, then the next step of every game, and so on.
+#
+# Each game still has its own grid, NPCs and seed, built the same way
+# round_runner.run_round() builds them, so each one plays out exactly like
+# it would on its own. What they share is everything that only depends on
+# the walls (see Grid.share_tables()): the visibility table, distance
+# fields, path cache, hierarchy, and the hider's layers for each seeker
+# view. Most of a round's time goes into working those out, and with lots
+# of games on a small level, whatever one game asks for, another one has
+# usually already worked out.
+#
+# Most steps, all an NPC does is count down its timers and slide a bit
+# further along its path, and on a 20x20 level doing that one game at a
+# time is mostly Python overhead. So the NPCs' movement is kept as arrays
+# with a slot per game (NpcArrays): position, the point on the path it's
+# heading for, how far along the path it is, its think, thought, stink and
+# freeze timers, and each game's clock. A step moves all of them at once,
+# and the bookkeeping after it (path lengths, exposure, who got caught)
+# goes over the arrays too. The NPC objects only get used when something
+# happens in one game: an NPC thinks, the seeker stinks, the hider works
+# on its analysis, or the stench fades. Then that game's slots are copied
+# into its objects, the method runs, and the slots get copied back (see
+# GameArrays.call()).
+#
+# The array math is the same as Npc.update() and Npc.skip(), down to the
+# order things get added in, so positions come out the same to the last
+# bit. (x ** 2 on a Python float isn't always exactly x * x, which is why
+# it squares with np.float_power() instead of np.square().) If those change,
+# this has to change with them.
+#
+# With event_driven on (see SimulationManager), each game jumps ahead to
+# its own next event, so the games end up on different step numbers. They
+# still take turns, one played step each per pass. Working out how far each
+# can jump still asks its NPCs (SimulationManager._quiet_steps()), but the
+# jump itself is done on the arrays.
+#
+# Without numpy there's nothing to step together, so the games play one
+# after another, still sharing the tables.
+#
+# The cache metrics in the results count hits on the shared tables, so
+# they'll be higher than for rounds played on their own.
+import math
+import time
+from typing import Dict, List, Optional
+
+from models.grid_storage import HAS_NUMPY, np
+from models.vector import Vector2
+from simulation.simulation_manager import SimulationManager
+
+
+# A set of arrays with a slot per game still playing. When games end,
+# keep() drops their slots from every array (and list) at once.
+class SlotArrays:
+    def keep(self, mask) -> None:
+        for name, value in list(vars(self).items()):
+            if isinstance(value, np.ndarray):
+                setattr(self, name, value[mask])
+            elif isinstance(value, list):
+                setattr(self, name, [item for item, kept in zip(value, mask) if kept])
+            elif isinstance(value, SlotArrays):
+                value.keep(mask)
+
+
+# One NPC from every game (all the seekers, or all the hiders). read() and
+# write() copy a slot from and to its NPC object.
+class NpcArrays(SlotArrays):
+    def __init__(self, npcs: list):
+        count = len(npcs)
+        self.npcs = list(npcs)
+        self.paths = [[] for _ in range(count)]
+        self.x = np.zeros(count)
+        self.y = np.zeros(count)
+        # The point on the path it's heading for
+        self.waypoint_x = np.zeros(count)
+        self.waypoint_y = np.zeros(count)
+        self.cursor = np.zeros(count, dtype=np.int64) # Npc.current_path_index
+        self.path_length = np.zeros(count, dtype=np.int64)
+        self.speed = np.zeros(count)
+        self.can_think = np.zeros(count, dtype=bool)
+        self.think_timer = np.zeros(count)
+        self.thought_timer = np.zeros(count)
+        self.has_thought = np.zeros(count, dtype=bool)
+        # Every game's NPC is the same kind
+        self.think_interval = npcs[0].THINK_INTERVAL
+        self.thought_duration = npcs[0].THOUGHT_DURATION
+        for k in range(count):
+            self.read(k)
+
+    def read(self, k: int) -> None:
+        npc = self.npcs[k]
+        self.x[k] = npc.position.x
+        self.y[k] = npc.position.y
+        path = npc.path or []
+        self.paths[k] = path
+        self.cursor[k] = npc.current_path_index
+        self.path_length[k] = len(path)
+        if npc.current_path_index < len(path):
+            point = path[npc.current_path_index]
+            self.waypoint_x[k] = point.x
+            self.waypoint_y[k] = point.y
+        self.speed[k] = npc.speed
+        self.can_think[k] = npc.can_think
+        self.think_timer[k] = npc.think_timer
+        self.thought_timer[k] = npc.thought_timer
+        self.has_thought[k] = bool(npc.thought_text)
+
+    def write(self, k: int) -> None:
+        npc = self.npcs[k]
+        npc.position = Vector2(float(self.x[k]), float(self.y[k]))
+        npc.current_path_index = int(self.cursor[k])
+        npc.think_timer = float(self.think_timer[k])
+        npc.thought_timer = float(self.thought_timer[k])
+        if not self.has_thought[k]:
+            npc.thought_text = None
+
+    # Npc.think_due() for every slot. Returns which ones think now.
+    def think_due(self, dt: float):
+        self.think_timer += dt
+        due = self.think_timer >= self.think_interval
+        self.think_timer[due] = 0.0
+        return due & self.can_think
+
+    def count_down_thoughts(self, dt: float) -> None:
+        showing = self.has_thought
+        self.thought_timer[showing] += dt
+        done = showing & (self.thought_timer >= self.thought_duration)
+        self.has_thought[done] = False
+        self.thought_timer[done] = 0.0
+
+    # The moving part of Npc.update().
+    def move(self, dt: float) -> None:
+        moving = self.cursor < self.path_length
+        dx, dy, dist = self._to_waypoint()
+        arrived = moving & (dist < 0.1)
+        if arrived.any():
+            for k in np.flatnonzero(arrived):
+                self.cursor[k] += 1
+                if self.cursor[k] < self.path_length[k]:
+                    point = self.paths[k][self.cursor[k]]
+                    self.waypoint_x[k] = point.x
+                    self.waypoint_y[k] = point.y
+            moving = self.cursor < self.path_length
+            dx, dy, dist = self._to_waypoint()
+        going = moving & (dist > 0)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            step = np.minimum(self.speed * dt, dist)
+            self.x = np.where(going, self.x + dx / dist * step, self.x)
+            self.y = np.where(going, self.y + dy / dist * step, self.y)
+
+    # Npc.skip(), for the slots where `steps` isn't 0.
+    def skip(self, dt: float, steps) -> None:
+        skipping = steps > 0
+        elapsed = dt * steps
+        self.think_timer = np.where(skipping, self.think_timer + elapsed, self.think_timer)
+        showing = skipping & self.has_thought
+        self.thought_timer = np.where(showing, self.thought_timer + elapsed, self.thought_timer)
+        done = showing & (self.thought_timer >= self.thought_duration)
+        self.has_thought[done] = False
+        self.thought_timer[done] = 0.0
+        dx, dy, dist = self._to_waypoint()
+        going = skipping & (self.cursor < self.path_length) & (dist != 0)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            distance = self.speed * dt * steps
+            self.x = np.where(going, self.x + dx / dist * distance, self.x)
+            self.y = np.where(going, self.y + dy / dist * distance, self.y)
+
+    def _to_waypoint(self):
+        dx = self.waypoint_x - self.x
+        dy = self.waypoint_y - self.y
+        return dx, dy, np.sqrt(np.float_power(dx, 2) + np.float_power(dy, 2))
+
+
+class SeekerArrays(NpcArrays):
+    def __init__(self, seekers: list):
+        count = len(seekers)
+        self.stink_timer = np.zeros(count)
+        self.freeze_timer = np.zeros(count)
+        self.stink_interval = seekers[0].STINK_INTERVAL
+        super().__init__(seekers)
+
+    def read(self, k: int) -> None:
+        super().read(k)
+        self.stink_timer[k] = self.npcs[k].stink_timer
+        self.freeze_timer[k] = self.npcs[k].freeze_timer
+
+    def write(self, k: int) -> None:
+        super().write(k)
+        self.npcs[k].stink_timer = float(self.stink_timer[k])
+        self.npcs[k].freeze_timer = float(self.freeze_timer[k])
+
+    # The timers at the start of Seeker.update(). Returns which ones stink now.
+    def stink_due(self, dt: float):
+        self.stink_timer += dt
+        self.freeze_timer -= dt
+        due = self.stink_timer >= self.stink_interval
+        self.stink_timer[due] = 0.0
+        return due
+
+    def skip(self, dt: float, steps) -> None:
+        skipping = steps > 0
+        self.stink_timer = np.where(skipping, self.stink_timer + dt * steps, self.stink_timer)
+        self.freeze_timer = np.where(skipping, self.freeze_timer - dt * steps, self.freeze_timer)
+        super().skip(dt, steps)
+
+
+class HiderArrays(NpcArrays):
+    def __init__(self, hiders: list):
+        self.analyzing = np.zeros(len(hiders), dtype=bool)
+        super().__init__(hiders)
+
+    def read(self, k: int) -> None:
+        super().read(k)
+        self.analyzing[k] = self.npcs[k].analyzing
+
+
+# The games still playing, with their clocks, NPCs and everything the round
+# counts, a slot per game. The same steps as _run_single_round(), for games
+# the way GameSetup.build() makes them: the seeker moves on its own
+# (auto_move) and nobody thinks on a ThinkPool.
+class GameArrays(SlotArrays):
+    def __init__(self, games: List[SimulationManager]):
+        count = len(games)
+        self.games = list(games)
+        self.ids = list(range(count)) # where each game is in the batch
+        self.seekers = SeekerArrays([game.seeker for game in games])
+        self.hiders = HiderArrays([game.hider for game in games])
+        # Each game's clock, and when its stench last faded (see
+        # StenchField.catch_up())
+        self.now = np.array([game.grid.clock.now() for game in games], dtype=float)
+        self.decayed_at = np.zeros(count)
+        self.has_trail = np.zeros(count, dtype=bool)
+        self.decay_step = games[0].grid.stench.DECAY_STEP
+        for k in range(count):
+            self._read_stench(k)
+        self.steps = np.zeros(count, dtype=np.int64)
+        self.s_path_length = np.zeros(count, dtype=np.int64)
+        self.h_path_length = np.zeros(count, dtype=np.int64)
+        self.num_steps_exposed = np.zeros(count, dtype=np.int64)
+        self.num_exposure_events = np.zeros(count, dtype=np.int64)
+        self.hider_was_exposed = np.zeros(count, dtype=bool)
+        self.was_caught = np.zeros(count, dtype=bool)
+        # The tile (by index, like the grid) everyone was on last step, -1
+        # for none yet. The seeker's visibility and the exposure only change
+        # when someone changes tiles, so they only get worked out again then.
+        self.size = games[0].grid.size
+        self.last_s = np.full(count, -1, dtype=np.int64)
+        self.last_h = np.full(count, -1, dtype=np.int64)
+        # Exposure checks that didn't need doing again. They still count
+        # towards nodes_gotten, like they would on their own.
+        self.checks_saved = np.zeros(count, dtype=np.int64)
+        self.starting_s_pos = [game.seeker.position.to_grid_pos() for game in games]
+        self.starting_h_pos = [game.hider.position.to_grid_pos() for game in games]
+
+    # Runs fn(*args) for game k, with its objects up to date.
+    def call(self, k: int, fn, *args):
+        self.write(k)
+        result = fn(*args)
+        self.seekers.read(k)
+        self.hiders.read(k)
+        self._read_stench(k)
+        return result
+
+    # Copies game k's slots into its objects.
+    def write(self, k: int) -> None:
+        self.games[k].grid.clock.time = float(self.now[k])
+        self.seekers.write(k)
+        self.hiders.write(k)
+
+    def _read_stench(self, k: int) -> None:
+        stench = self.games[k].grid.stench
+        self.decayed_at[k] = stench.decayed_at
+        self.has_trail[k] = bool(stench.trail)
+
+    # The rest of Grid.advance_time(), for the games whose clocks just moved.
+    def _catch_up(self, moved) -> None:
+        due = moved & self.has_trail & (self.now - self.decayed_at >= self.decay_step)
+        for k in np.flatnonzero(due):
+            self.call(k, self.games[k].grid.stench.catch_up)
+
+    # For event-driven games: jumps each one ahead to its next event, but
+    # never past `last_step` (see _run_single_round()).
+    def skip_quiet_steps(self, dt: float, last_step: int) -> None:
+        skipped = np.zeros(len(self.games), dtype=np.int64)
+        for k in np.flatnonzero(self.steps > 0):
+            quiet = self.call(k, self.games[k]._quiet_steps, dt)
+            skipped[k] = max(min(quiet, last_step - self.steps[k]), 0)
+        if not skipped.any():
+            return
+        skipping = skipped > 0
+        self.now = np.where(skipping, self.now + dt * skipped, self.now)
+        self._catch_up(skipping)
+        self.seekers.skip(dt, skipped)
+        self.hiders.skip(dt, skipped)
+        self.steps += skipped
+        # See _run_single_round()
+        self.num_steps_exposed += np.where(self.hider_was_exposed, skipped, 0)
+
+    # A step of every game: Grid.advance_time(), Seeker.update() then
+    # Hider.update().
+    def step(self, dt: float) -> None:
+        self.steps += 1
+        self.now += dt
+        self._catch_up(True)
+        seekers, hiders = self.seekers, self.hiders
+        for k in np.flatnonzero(seekers.stink_due(dt)):
+            self.call(k, seekers.npcs[k].stink)
+        for k in np.flatnonzero(seekers.think_due(dt)):
+            self.call(k, seekers.npcs[k].think)
+        seekers.count_down_thoughts(dt)
+        seekers.move(dt)
+        for k in np.flatnonzero(hiders.analyzing):
+            self.call(k, hiders.npcs[k].work_on_analysis, hiders.npcs[k].think_budget)
+        for k in np.flatnonzero(hiders.think_due(dt)):
+            self.call(k, hiders.npcs[k].think)
+        hiders.count_down_thoughts(dt)
+        hiders.move(dt)
+
+    # The bookkeeping after a step. Returns which games just ended.
+    def tally(self, max_steps: float):
+        size = self.size
+        # to_grid_pos(), as an index
+        s = self.seekers.x.astype(np.int64) + self.seekers.y.astype(np.int64) * size
+        h = self.hiders.x.astype(np.int64) + self.hiders.y.astype(np.int64) * size
+        s_moved = s != self.last_s
+        h_moved = h != self.last_h
+        self.s_path_length += s_moved
+        self.h_path_length += h_moved
+        self.last_s = s
+        self.last_h = h
+        for k in np.flatnonzero(s_moved):
+            self.games[k].grid.update_visibility((int(s[k]) % size, int(s[k]) // size))
+        exposed = self.hider_was_exposed.copy()
+        recheck = s_moved | h_moved
+        for k in np.flatnonzero(recheck):
+            s_pos = (int(s[k]) % size, int(s[k]) // size)
+            h_pos = (int(h[k]) % size, int(h[k]) // size)
+            exposed[k] = not self.games[k].grid.is_wall_between(s_pos, h_pos)
+        self.checks_saved += ~recheck
+        self.num_steps_exposed += exposed
+        self.num_exposure_events += exposed & ~self.hider_was_exposed
+        self.hider_was_exposed = exposed
+        # SimulationManager._is_caught()
+        self.was_caught = (self.seekers.freeze_timer <= 0) & (s == h)
+        return self.was_caught | (self.steps >= max_steps)
+
+    # The results for game k, once it's ended.
+    def record(self, k: int) -> Dict:
+        game = self.games[k]
+        self.write(k) # so its NPCs end up where the round did
+        game.grid.nodes_gotten += int(self.checks_saved[k])
+        return game._round_record(
+            bool(self.was_caught[k]), int(self.steps[k]), int(self.num_steps_exposed[k]),
+            int(self.num_exposure_events[k]), int(self.s_path_length[k]), int(self.h_path_length[k]),
+            self.starting_s_pos[k], self.starting_h_pos[k]
+        )
+
+
+class BatchRunner:
+    # About how many tiles' worth of results each shared cache can hold.
+    # On small levels that's enough for a view and a distance field from
+    # every tile, so the games stop throwing out each other's. Big levels
+    # keep the usual cache sizes.
+    CACHE_TILES = 1 << 22
+
+    # `setup`: the round_runner.GameSetup to build every game from.
+    # `seeds`: one per game.
+    def __init__(self, setup, seeds: List[int]):
+        self.seeds = list(seeds)
+        self.games: List[SimulationManager] = []
+        for seed in self.seeds:
+            game = setup.build(share_with=self.games[0] if self.games else None)
+            game.grid.random.seed(seed)
+            game.reset_game()
+            self.games.append(game)
+        if self.games:
+            grid = self.games[0].grid
+            tiles = grid.size * grid.size
+            entries = min(tiles, self.CACHE_TILES // tiles)
+            grid.views.size = max(grid.views.size, entries)
+            grid.distances.MAX_FIELDS = max(grid.distances.MAX_FIELDS, entries)
+
+    # Plays every game to the end and returns their results, in the same
+    # order as the seeds.
+    def run(self) -> List[Dict]:
+        if not self.games:
+            return []
+        if not HAS_NUMPY:
+            results = []
+            for game, seed in zip(self.games, self.seeds):
+                start_time = time.time()
+                result = game._run_single_round()
+                result['sim_time'] = time.time() - start_time
+                result['seed'] = seed
+                results.append(result)
+            return results
+        start_time = time.time()
+        timestep = SimulationManager.TIMESTEP
+        max_steps = SimulationManager.MAX_GAME_TIME / timestep
+        last_step = math.ceil(max_steps) - 1 # never skipped, so rounds end where they would
+        event_driven = self.games[0].event_driven
+        for game in self.games:
+            game._reset_metrics()
+        playing = GameArrays(self.games)
+        results: List[Optional[Dict]] = [None] * len(self.games)
+        while playing.games:
+            if event_driven:
+                playing.skip_quiet_steps(timestep, last_step)
+            playing.step(timestep)
+            ended = playing.tally(max_steps)
+            if ended.any():
+                for k in np.flatnonzero(ended):
+                    results[playing.ids[k]] = playing.record(k)
+                playing.keep(~ended)
+
+        # Nothing to time each game by on its own, so they split it evenly
+        sim_time = (time.time() - start_time) / len(self.games)
+        for result, seed in zip(results, self.seeds):
+            result['sim_time'] = sim_time
+            result['seed'] = seed
+        return results
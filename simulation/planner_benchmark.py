@@ -0,0 +1,76 @@
+# Times the seeker's IncrementalPlanner against plain Pathfinder.find_path()
+# (path cache off) on the replans the seeker actually does:
+# - walk: it takes a few steps along its path and replans to the same target
+# - paint: the user drags a line of walls, replanning for every tile
+#   (see App.handle_tile_click())
+# - chase: the target moves a tile every other step
+# It also checks the planner's paths are never longer than A*'s.
+#
+# Run it from the top folder: python -m simulation.planner_benchmark [size] [wall density]
+import math
+import random
+import sys
+import time
+
+from core.incremental_planner import IncrementalPlanner
+from core.pathfinder import Pathfinder
+from models.grid import Grid
+
+def real_length(path) -> float:
+    return sum(math.dist(a.get_position(), b.get_position()) for a, b in zip(path, path[1:]))
+
+def run(size: int = 120, density: float = 0.1, seed: int = 5) -> None:
+    grid = Grid(size, 600)
+    rng = random.Random(seed)
+    for _ in range(int(size * size * density)):
+        grid.set_wall(rng.randrange(size), rng.randrange(size), True)
+    pathfinder = Pathfinder(grid, cache_size=0)
+    planner = IncrementalPlanner(grid, pathfinder.for_agent())
+
+    def open_tile():
+        while True:
+            x, y = rng.randrange(size), rng.randrange(size)
+            if not grid.is_wall(x, y):
+                return x, y
+
+    for mode in ("walk", "paint", "chase"):
+        astar_time = planner_time = 0.0
+        replans = longer = 0
+        for _ in range(10):
+            start, goal = open_tile(), open_tile()
+            path = pathfinder.find_path(start, goal)
+            if len(path) < size // 2:
+                continue
+            planner.reset()
+            planner.find_path(start, goal)
+            wall_x, wall_y = open_tile()
+            step_x, step_y = rng.choice([(1, 0), (0, 1), (1, 1)])
+            for k in range(1, min(len(path), 30)):
+                if mode == "paint":
+                    wall_x, wall_y = wall_x + step_x, wall_y + step_y
+                    if not grid.is_valid_position(wall_x, wall_y) or (wall_x, wall_y) in (start, goal):
+                        break
+                    # Mostly drawing, sometimes erasing
+                    grid.set_wall(wall_x, wall_y, rng.random() < 0.9 or not grid.is_wall(wall_x, wall_y))
+                else:
+                    start = path[k].get_position()
+                if mode == "chase" and k % 2 == 0:
+                    for neighbor in grid.neighbor_indices(*goal):
+                        goal = (neighbor % size, neighbor // size)
+                        break
+                began = time.perf_counter()
+                expected = pathfinder.find_path(start, goal)
+                middle = time.perf_counter()
+                got = planner.find_path(start, goal)
+                astar_time += middle - began
+                planner_time += time.perf_counter() - middle
+                replans += 1
+                if len(got) > len(expected) or real_length(got) > real_length(expected) + 1e-9:
+                    longer += 1
+        print(f"{mode}: {replans} replans, A* {astar_time * 1000:.1f} ms, planner {planner_time * 1000:.1f} ms, "
+              f"{longer} longer paths")
+
+if __name__ == "__main__":
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 120
+    density = float(sys.argv[2]) if len(sys.argv) > 2 else 0.1
+    run(size, density)
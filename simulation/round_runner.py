@@ -0,0 +1,155 @@
+# Runs simulation rounds on a pool of processes, a fresh game every round.
+#
+# Every round gets its own seed, worked out from the whole run's seed and
+# the round number (see round_seed()), and builds its own grid and NPCs from
+# a GameSetup. Nothing carries over from one round to the next, so:
+# - rounds can go to whichever process is free, and the results still come
+#   back in round order, the same as running them one by one,
+# - any single round can be played again from just its seed, with
+#   run_round(setup, seed) (the seed is in the results).
+# Rounds can also be sent out in batches that get played together (see
+# batch_runner.py), which comes out the same, just quicker.
+import itertools
+import multiprocessing
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional
+
+from constants import *
+from core.hider import Hider
+from core.pathfinder import Pathfinder
+from core.seeker import Seeker
+from models.grid import Grid
+from models.grid_storage import HAS_NUMPY, NumpyGridStorage
+from simulation.batch_runner import BatchRunner
+from simulation.simulation_manager import SimulationManager
+
+
+# Everything needed to build a game from scratch. It's all plain data, so
+# it can be sent over to other processes.
+class GameSetup:
+    # `walls`: one byte per tile (like Grid.wall_bytes()), nonzero for walls.
+    # The rest are the settings of the same names on Grid, Pathfinder,
+    # Seeker, Hider and SimulationManager.
+    def __init__(self, size: int, walls: bytes, hider_characteristics: Dict[str, float],
+                 use_numpy: bool = HAS_NUMPY, use_jps: bool = False, cache_size: int = 256,
+                 cluster_size: Optional[int] = None, use_buckets: bool = False,
+                 seeker_speed: float = 4.0, hider_speed: float = 4.0, use_belief_map: bool = False,
+                 explore_distance_weight: float = 0.0, event_driven: bool = False):
+        self.size = size
+        self.walls = bytes(walls)
+        self.hider_characteristics = dict(hider_characteristics)
+        self.use_numpy = use_numpy
+        self.use_jps = use_jps
+        self.cache_size = cache_size
+        self.cluster_size = cluster_size
+        self.use_buckets = use_buckets
+        self.seeker_speed = seeker_speed
+        self.hider_speed = hider_speed
+        self.use_belief_map = use_belief_map
+        self.explore_distance_weight = explore_distance_weight
+        self.event_driven = event_driven
+
+    # The setup of the game these are playing right now.
+    @staticmethod
+    def from_game(grid: Grid, pathfinder: Pathfinder, seeker: Seeker, hider: Hider,
+                  event_driven: bool = False) -> "GameSetup":
+        return GameSetup(
+            grid.size,
+            grid.wall_bytes(),
+            hider.characteristics,
+            use_numpy=isinstance(grid.storage, NumpyGridStorage),
+            use_jps=pathfinder.use_jps,
+            cache_size=pathfinder.cache_size,
+            cluster_size=pathfinder.hierarchy.cluster_size if pathfinder.hierarchy else None,
+            use_buckets=pathfinder.use_buckets,
+            seeker_speed=seeker.speed,
+            hider_speed=hider.speed,
+            use_belief_map=seeker.belief is not None,
+            explore_distance_weight=seeker.explore_distance_weight,
+            event_driven=event_driven
+        )
+
+    # A new game, ready for SimulationManager.reset_game(). Nothing gets
+    # drawn, so there's no debug info, and the hider thinks all at once.
+    # `share_with`: another game built from this setup, to share the tables
+    # that only depend on the walls with (see Grid.share_tables()).
+    def build(self, share_with: Optional[SimulationManager] = None) -> SimulationManager:
+        grid = Grid(self.size, GRID_DISPLAY_SIZE, self.use_numpy)
+        for i, wall in enumerate(self.walls):
+            if wall:
+                grid.set_wall(i % self.size, i // self.size, True)
+        pathfinder = Pathfinder(
+            grid,
+            use_jps=self.use_jps,
+            cache_size=self.cache_size,
+            cluster_size=self.cluster_size,
+            use_buckets=self.use_buckets
+        )
+        grid.distances.use_buckets = self.use_buckets
+        grid.costs.whole_numbers = self.use_buckets # like the app does
+        if share_with is not None:
+            grid.share_tables(share_with.grid)
+            pathfinder.share_tables(share_with.pathfinder) # before the NPCs copy it
+        seeker = Seeker(
+            grid, pathfinder, SEEKER_COLOR, can_think=True, use_belief_map=self.use_belief_map,
+            explore_distance_weight=self.explore_distance_weight
+        )
+        hider = Hider(grid, pathfinder, color=HIDER_COLOR, can_think=True, characteristics=dict(self.hider_characteristics))
+        seeker.set_speed(self.seeker_speed)
+        hider.set_speed(self.hider_speed)
+        seeker.set_hider(hider)
+        return SimulationManager(grid, pathfinder, seeker, hider, event_driven=self.event_driven)
+
+
+# The seed for round `round_num` of a run seeded with `seed`.
+def round_seed(seed: int, round_num: int) -> int:
+    # Seeding with a string hashes it (the same way every time, unlike
+    # hash()), so nearby rounds get unrelated seeds.
+    return random.Random(f"{seed}/{round_num}").getrandbits(32)
+
+# Plays one round of a new game and returns its results.
+def run_round(setup: GameSetup, seed: int) -> Dict:
+    game = setup.build()
+    game.grid.random.seed(seed)
+    game.reset_game()
+    start_time = time.time()
+    result = game._run_single_round()
+    result['sim_time'] = time.time() - start_time # real seconds
+    result['seed'] = seed
+    return result
+
+# Plays a batch of rounds, one per seed, and returns their results.
+def run_batch(setup: GameSetup, seeds: List[int]) -> List[Dict]:
+    if len(seeds) == 1:
+        return [run_round(setup, seeds[0])]
+    return BatchRunner(setup, seeds).run()
+
+# Plays `iterations` rounds and returns their results, in round order.
+# `workers`: how many processes to run them on. None means one per CPU
+# core, 1 means run them all right here.
+# `batch_size`: how many rounds to play together at a time (each batch
+# goes to one process).
+def run_rounds(setup: GameSetup, iterations: int, seed: int, workers: Optional[int] = None,
+               batch_size: int = 1) -> List[Dict]:
+    seeds = [round_seed(seed, round_num) for round_num in range(iterations)]
+    batch_size = max(batch_size, 1)
+    batches = [seeds[i:i + batch_size] for i in range(0, iterations, batch_size)]
+    if workers == 1 or len(batches) <= 1:
+        results = map(run_batch, [setup] * len(batches), batches)
+        return _collect(itertools.chain.from_iterable(results))
+    # Spawn fresh processes instead of forking this one, since the app has
+    # pygame and threads going, which don't survive a fork well. It's what
+    # Windows and macOS do anyway.
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+        results = pool.map(run_batch, [setup] * len(batches), batches)
+        return _collect(itertools.chain.from_iterable(results))
+
+def _collect(results) -> List[Dict]:
+    collected = []
+    for round_num, result in enumerate(results):
+        print(f"Round {round_num} done (seed {result['seed']}, {'caught' if result['caught'] else 'escaped'})")
+        collected.append(result)
+    return collected
@@ -1,21 +1,34 @@
-import time
 import csv
+import math
 import os
 import random
-from typing import Dict, List
-from constants import FPS
+from typing import Dict, List, Optional
+from constants import FPS, SIM_BATCH_SIZE, SIM_EVENT_DRIVEN, SIM_WORKERS
 from models.grid import Grid
 from models.vector import Vector2
 from core.pathfinder import Pathfinder
 from core.seeker import Seeker
 from core.hider import Hider
+from core.think_pool import ThinkPool
 
 class SimulationManager:
-    def __init__(self, grid: Grid, pathfinder: Pathfinder, seeker: Seeker, hider: Hider):
+    # If the hider can stay away for this many in-game seconds (not real
+    # seconds), it wins.
+    MAX_GAME_TIME = 4 * 60
+    # Seconds of game time per step
+    TIMESTEP = FPS / 1000
+
+    # `think_pool`: if the NPCs think on one of these (see think_pool.py).
+    # `event_driven`: rounds jump over the steps where nothing happens (see
+    # _run_single_round()).
+    def __init__(self, grid: Grid, pathfinder: Pathfinder, seeker: Seeker, hider: Hider, think_pool: Optional[ThinkPool] = None,
+                 event_driven: bool = False):
         self.grid = grid
         self.pathfinder = pathfinder
         self.seeker = seeker
         self.hider = hider
+        self.think_pool = think_pool
+        self.event_driven = event_driven
         self.results = []
     
     def reset_game(self) -> None:
@@ -24,21 +37,23 @@ class SimulationManager:
         # Tell the seeker to freeze for a moment to give the hider a chance to run away.
         self.seeker.freeze()
 
-    def run_simulation(self, iterations: int, level_name: str, hider_name: str):
-        # Run multiple simulation rounds and collect data
-        self.results = []
-
-        for round_num in range(iterations):
-            self.reset_game()
-            # Run the simulation
-            print(f"Round {round_num} begin!")
-            start_time = time.time()
-            result = self._run_single_round()
-            result['sim_time'] = time.time() - start_time
-            self.results.append(result)
-
+    # Every round is a new game set up like this one, played on a pool of
+    # `workers` processes, `batch_size` rounds at a time (see
+    # round_runner.py). With the same `seed`, the results come out the same.
+    # If it's not given, a random one is picked (and printed, so the run can
+    # be repeated). `event_driven`: see _run_single_round().
+    def run_simulation(self, iterations: int, level_name: str, hider_name: str,
+                       seed: Optional[int] = None, workers: Optional[int] = SIM_WORKERS,
+                       batch_size: int = SIM_BATCH_SIZE, event_driven: bool = SIM_EVENT_DRIVEN):
+        # Imported here because round_runner imports this module
+        from simulation.round_runner import GameSetup, run_rounds
+        if seed is None:
+            seed = random.randrange(2 ** 32)
+        print(f"Running {iterations} rounds with seed {seed}")
+        setup = GameSetup.from_game(self.grid, self.pathfinder, self.seeker, self.hider, event_driven)
+        self.results = run_rounds(setup, iterations, seed, workers, batch_size)
         self.generate_report(level_name, hider_name, iterations)
-    
+
     def _is_caught(self) -> bool:
         if self.seeker.is_frozen():
             return False
@@ -48,32 +63,51 @@ class SimulationManager:
         return (abs(seeker_pos[0] - hider_pos[0]) == 0 and 
                 abs(seeker_pos[1] - hider_pos[1]) == 0)
     
+    # Most steps only slide the NPCs a bit further along their paths. If
+    # event_driven is on, those get done all at once (see
+    # Npc.quiet_steps()), and only the steps where something happens
+    # (someone thinks, stinks, unfreezes, reaches a point on their path or
+    # steps onto another tile) get played out. The results come out the same
+    # as playing every step, give or take rounding in where the NPCs are.
     def _run_single_round(self) -> Dict:
         # Run a single simulation round and return metrics
-        # If the hider can stay away for this many in-game seconds
-        # (not real seconds), it wins.
-        max_game_time_s = 4 * 60
         steps = 0
         s_path_length = 0
         h_path_length = 0
         last_s_pos = None
         last_h_pos = None
-        timestep = FPS / 1000 # in in-game seconds
-        max_steps = max_game_time_s / timestep
+        timestep = self.TIMESTEP
+        max_steps = self.MAX_GAME_TIME / timestep
         num_steps_exposed = 0 # Keeping track of how long the hider has been exposed for.
         num_exposure_events = 0 # Count how many times the hider goes from not-exposed to exposed.
-        self.grid.nodes_gotten = 0
+        self._reset_metrics()
         was_caught = False
         hider_was_exposed = False
+        last_visibility_pos = None
 
         # Record starting positions
         starting_s_pos = self.seeker.position.to_grid_pos()
         starting_h_pos = self.hider.position.to_grid_pos()
 
         while steps < max_steps:
+            if self.event_driven and steps > 0:
+                # Never skip the last step, so rounds end where they would
+                skipped = min(self._quiet_steps(timestep), math.ceil(max_steps) - steps - 1)
+                if skipped > 0:
+                    self._skip(timestep, skipped)
+                    steps += skipped
+                    # Npc.quiet_steps() never counts a step onto another
+                    # tile, so over the skipped steps the hider stays as
+                    # exposed as it was on the last one. If quiet_steps()
+                    # ever lets NPCs change tiles, this has to check each one.
+                    if hider_was_exposed:
+                        num_steps_exposed += skipped
             steps += 1
             
             # Update NPCs
+            self.grid.advance_time(timestep) # game time, however long this step really took
+            if self.think_pool:
+                self.think_pool.think(timestep)
             self.seeker.update(timestep)  # Fixed small time step for consistency
             self.hider.update(timestep)
             
@@ -86,9 +120,15 @@ class SimulationManager:
             if last_h_pos != current_h_pos:
                 h_path_length += 1
                 last_h_pos = current_h_pos
+            # The hider decides where to hide based on what the seeker can see,
+            # so keep that up to date. It only changes when the seeker changes tiles.
+            if current_s_pos != last_visibility_pos:
+                self.grid.update_visibility(current_s_pos)
+                last_visibility_pos = current_s_pos
             
 
-            is_exposed = self.grid.is_wall_between(self.seeker.position.to_grid_pos(), self.hider.position.to_grid_pos())
+            # Exposed means the seeker can see it, so no wall in between
+            is_exposed = not self.grid.is_wall_between(current_s_pos, current_h_pos)
             if is_exposed:
                 num_steps_exposed += 1
                 if not hider_was_exposed:
@@ -102,20 +142,63 @@ class SimulationManager:
                 was_caught = True
                 break
         
+        return self._round_record(
+            was_caught, steps, num_steps_exposed, num_exposure_events,
+            s_path_length, h_path_length, starting_s_pos, starting_h_pos
+        )
+
+    # How many steps in a row nothing would happen in.
+    def _quiet_steps(self, timestep: float) -> int:
+        steps = self.seeker.quiet_steps(timestep)
+        if steps: # no need to ask the rest otherwise
+            steps = min(steps, self.hider.quiet_steps(timestep))
+        if steps:
+            steps = min(steps, self.grid.stench.quiet_steps(timestep))
+        return steps
+
+    # Plays `steps` steps where nothing happens, all at once.
+    def _skip(self, timestep: float, steps: int) -> None:
+        self.grid.advance_time(timestep * steps)
+        self.seeker.skip(timestep, steps)
+        self.hider.skip(timestep, steps)
+
+    # Zeroes the metrics that get counted up over a round.
+    def _reset_metrics(self) -> None:
+        self.grid.nodes_gotten = 0
+        # Each NPC searches with its own copy of the pathfinder
+        for pathfinder in (self.seeker.pathfinder, self.hider.pathfinder):
+            pathfinder.cache_hits = 0
+            pathfinder.cache_misses = 0
+            pathfinder.heap_fallbacks = 0
+        self.hider.think_cache_hits = 0
+        self.hider.think_cache_misses = 0
+
+    # The results of a round that went for `steps` steps.
+    def _round_record(self, was_caught: bool, steps: int, num_steps_exposed: int, num_exposure_events: int,
+                      s_path_length: int, h_path_length: int, starting_s_pos, starting_h_pos) -> Dict:
+        pathfinders = (self.seeker.pathfinder, self.hider.pathfinder)
         return {
             'caught': was_caught,
             'steps': steps,
             'time_elapsed': steps / FPS,
+            # Time the seeker could see the hider (no wall in between).
+            # Results from before the fix in the exposure check counted the
+            # opposite, the time it was hidden.
             'time_exposed': num_steps_exposed / FPS,
             'num_exposure_events': num_exposure_events,
             'nodes_gotten': self.grid.nodes_gotten,
+            'path_cache_hits': sum(pathfinder.cache_hits for pathfinder in pathfinders),
+            'path_cache_misses': sum(pathfinder.cache_misses for pathfinder in pathfinders),
+            'heap_fallbacks': sum(pathfinder.heap_fallbacks for pathfinder in pathfinders),
+            'think_cache_hits': self.hider.think_cache_hits,
+            'think_cache_misses': self.hider.think_cache_misses,
             's_path_length': s_path_length,
             'h_path_length': h_path_length,
             'final_distance': self._get_distance(),
             'starting_seeker_position': starting_s_pos,
             'starting_hider_position': starting_h_pos
         }
-    
+
     def _get_distance(self) -> int:
         # Get Manhattan distance between seeker and hider
         seeker_pos = self.seeker.position.to_grid_pos()
@@ -10,10 +10,24 @@ from core.hider import Hider
 from core.pathfinder import Pathfinder
 from core.npc import Npc
 from core.seeker import Seeker
+from core.think_pool import ThinkPool
 from models.grid import Grid
 from models.vector import Vector2
 from level_manager import LevelManager
 from simulation.simulation_manager import SimulationManager
+from ui.render import draw_grid, draw_npc, draw_search_debug
+
+# Keys for steering the seeker by hand -> which way they push it
+MOVE_KEYS = {
+    pygame.K_w: (0, -1),
+    pygame.K_s: (0, 1),
+    pygame.K_a: (-1, 0),
+    pygame.K_d: (1, 0),
+    pygame.K_UP: (0, -1),
+    pygame.K_DOWN: (0, 1),
+    pygame.K_LEFT: (-1, 0),
+    pygame.K_RIGHT: (1, 0)
+}
 
 # This App class is where alll those other classes come together.
 class App:
@@ -34,8 +48,17 @@ class App:
         )
         # Initialize our non-pygame stuff
         self.grid: Grid = Grid(GRID_SIZE, GRID_DISPLAY_SIZE)
-        self.pathfinder = Pathfinder(self.grid)
-        self.seeker_npc = Seeker(self.grid, self.pathfinder, SEEKER_COLOR, can_think=True)
+        self.pathfinder = Pathfinder(
+            self.grid,
+            cluster_size=HIERARCHY_CLUSTER_SIZE if GRID_SIZE >= HIERARCHY_MIN_GRID_SIZE else None,
+            use_buckets=True
+        )
+        self.grid.distances.use_buckets = True
+        self.grid.costs.whole_numbers = True # or the stench trail rules the buckets out
+        self.seeker_npc = Seeker(
+            self.grid, self.pathfinder, SEEKER_COLOR, can_think=True, use_belief_map=SEEKER_BELIEF_MAP,
+            explore_distance_weight=SEEKER_EXPLORE_DISTANCE_WEIGHT
+        )
         self.hider_npcs = [
             {
                 "name": "Hider A",
@@ -89,13 +112,20 @@ class App:
             can_think=True,
             characteristics=self.hider_npcs[self.hider_index]["characteristics"]
         )
+        self.hider_npc.think_budget = HIDER_THINK_BUDGET
         self.seeker_npc.set_hider(self.hider_npc)
+        # With more than one thread, the NPCs think at the same time
+        self.think_pool = None
+        if THINK_THREADS > 1:
+            self.think_pool = ThinkPool([self.seeker_npc, self.hider_npc], self.pathfinder, THINK_THREADS)
         self.debug_mode = True
+        # The pathfinder only needs to remember what it searched if we draw it
+        self.pathfinder.record_debug = self.debug_mode
         self.cheats = False
         self.seeker_manual_mode = False # False = AI controlled, True = keyboard controlled
         self.mouse_down = False
         self.last_toggle_pos = None
-        self.simulation_manager = SimulationManager(self.grid, self.pathfinder, self.seeker_npc, self.hider_npc)
+        self.simulation_manager = SimulationManager(self.grid, self.pathfinder, self.seeker_npc, self.hider_npc, self.think_pool)
         self.create_ui()
         self.reset_game()
         self.splash_text = ""
@@ -253,6 +283,7 @@ class App:
                     match event.ui_element:
                         case self.debug_button:
                             self.debug_mode = not self.debug_mode
+                            self.pathfinder.record_debug = self.debug_mode
                             self.debug_button.set_text(f"Debug: {'ON' if self.debug_mode else 'OFF'}")
                         case self.hider_ai_button:
                             self.next_hider()
@@ -313,11 +344,10 @@ class App:
     def update_visibility(self):
         # A gridnode is marked not visible if there is a wall tile between its
         # grid position and the npc
-        for nrow in self.grid.nodes:
-            for n in nrow:
-                n_pos = n.get_position()
-                n.seen_by_seeker = not self.grid.is_wall_between(n_pos, self.seeker_npc.position.to_grid_pos())
-                n.seen_by_hider = not self.grid.is_wall_between(n_pos, self.hider_npc.position.to_grid_pos())
+        self.grid.update_visibility(
+            self.seeker_npc.position.to_grid_pos(),
+            self.hider_npc.position.to_grid_pos()
+        )
             
 
     def handle_tile_click(self):
@@ -366,6 +396,12 @@ class App:
             print("Game over, seeker won.")
             self.set_splash_text("Game over.")  # Show the game over screen
             self.reset_game()
+        if not self.seeker_npc.auto_move:
+            keys = pygame.key.get_pressed()
+            self.seeker_npc.steering = [direction for key, direction in MOVE_KEYS.items() if keys[key]]
+        self.grid.advance_time(dt)
+        if self.think_pool:
+            self.think_pool.think(dt)
         self.seeker_npc.update(dt)
         self.hider_npc.update(dt)
         self.update_visibility()
@@ -373,17 +409,18 @@ class App:
     
     def draw(self):
         self.screen.fill(BACKGROUND_COLOR)
-        self.grid.draw(self.screen, self.seeker_manual_mode)
+        draw_grid(self.screen, self.grid, self.seeker_manual_mode)
         if self.debug_mode:
-            self.pathfinder.draw_debug(self.screen)
-        self.seeker_npc.draw(self.screen, self.debug_mode)
+            draw_search_debug(self.screen, self.seeker_npc.pathfinder)
+            draw_search_debug(self.screen, self.hider_npc.pathfinder)
+        draw_npc(self.screen, self.seeker_npc, self.debug_mode)
         # If you're controlling the seeker, you shouldn't see the
         # hider if it's out of line of sight. Unless "cheats" is on of course
         if self.seeker_manual_mode:
             if self.cheats or not self.grid.is_wall_between(self.seeker_npc.position.to_grid_pos(), self.hider_npc.position.to_grid_pos()):
-                self.hider_npc.draw(self.screen, self.debug_mode)
+                draw_npc(self.screen, self.hider_npc, self.debug_mode)
         else:
-            self.hider_npc.draw(self.screen, self.debug_mode)
+            draw_npc(self.screen, self.hider_npc, self.debug_mode)
         self.ui_manager.draw_ui(self.screen)
         if self.splash_text_timer > 0:
             self.draw_splash_text()
@@ -397,6 +434,8 @@ class App:
             self.handle_events()
             self.update(dt)
             self.draw()
+        if self.think_pool:
+            self.think_pool.close()
         pygame.quit()
 
     # display game over
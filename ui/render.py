@@ -0,0 +1,136 @@
+# Everything that draws the game with pygame.
+# The grid, NPCs and pathfinders don't know about pygame at all, so they
+# can run headless (like for simulations on a machine with no display).
+# These functions take them and draw them onto a pygame "surface", which is
+# like a render texture in other frameworks/engines.
+import pygame
+
+from constants import *
+from core.hider import Hider
+from core.npc import Npc
+from core.pathfinder import Pathfinder
+from models.grid import Grid
+from models.grid_node import GridNode
+
+# If partial is true, then tiles will either be white if in view of seeker, or
+# black otherwise. That's meant for human seeker to not have unfair visibility.
+def draw_grid(surface: pygame.Surface, grid: Grid, partial: bool):
+    # tiles
+    for y in range(grid.size):
+        for x in range(grid.size):
+            node = GridNode(grid, x, y)
+            if partial:
+                if node.seen_by_seeker:
+                    color = (190, 190, 190)
+                else:
+                    color = (0, 0, 0)  # Black for unseen tiles
+                if node.is_wall:
+                    color = (80, 60, 190)
+            else:
+                if node.is_wall:
+                    color = WALL_TILE_COLOR
+                else:
+                    color = EMPTY_TILE_COLOR
+                if node.seen_by_seeker:
+                    color = grid.add_colors(color, (0, 0, 50))
+                if node.seen_by_hider:
+                    color = grid.add_colors(color, (50, 0, 0))
+
+            rect = pygame.Rect(
+                *grid.grid_to_screen(x, y),
+                grid.tile_size,
+                grid.tile_size
+            )
+            pygame.draw.rect(surface, color, rect)
+    # grid lines
+    for i in range(grid.size + 1):
+        pos = i * grid.tile_size
+        pygame.draw.line(
+            surface, GRID_LINE_COLOR,
+            (0, pos + UI_HEIGHT),
+            (grid.display_size, pos + UI_HEIGHT)
+        )
+        pygame.draw.line(
+            surface, GRID_LINE_COLOR,
+            (pos, UI_HEIGHT),
+            (pos, grid.display_size + UI_HEIGHT)
+        )
+
+# Draws visuals to see what the AI is doing e.g. what path it's taking.
+# Turn on the pathfinder's record_debug to get the visited/frontier dots.
+def draw_search_debug(surface: pygame.Surface, pathfinder: Pathfinder):
+    grid = pathfinder.grid
+    size = grid.size
+    for i in pathfinder.visited_nodes:
+        x, y = grid.grid_to_screen(i % size + 0.5, i // size + 0.5)
+        pygame.draw.circle(surface, VISITED_NODE_COLOR, (x, y), grid.tile_size * 0.1)
+    for i in pathfinder.frontier_nodes:
+        x, y = grid.grid_to_screen(i % size + 0.5, i // size + 0.5)
+        pygame.draw.circle(surface, FRONTIER_NODE_COLOR, (x, y), grid.tile_size * 0.1)
+    # the path
+    if len(pathfinder.path) > 1:
+        points = [
+            grid.grid_to_screen(node.x + 0.5, node.y + 0.5)
+            for node in pathfinder.path
+        ]
+        pygame.draw.lines(surface, PATH_COLOR, False, points, width=3)
+
+# When debug is true, extra helpful visuals are drawn.
+def draw_npc(surface: pygame.Surface, npc: Npc, debug: bool):
+    grid = npc.grid
+    if debug and isinstance(npc, Hider):
+        draw_hider_debug(surface, npc)
+    pygame.draw.circle(
+        surface, npc.color,
+        center = grid.grid_to_screen(npc.position.x, npc.position.y),
+        radius = grid.tile_size * 0.4
+    )
+    if npc.auto_move:
+        if debug:
+            # the target it's going towards
+            if npc.target:
+                x, y = grid.grid_to_screen(npc.target.x + 0.5, npc.target.y + 0.5)
+                size = grid.tile_size * 0.4
+                # X shape
+                pygame.draw.line(surface, npc.color,
+                                (x - size, y - size),
+                                (x + size, y + size),
+                                width=3)
+                pygame.draw.line(surface, npc.color,
+                                (x + size, y - size),
+                                (x - size, y + size),
+                                width=3)
+            # Only draw the path if auto_move is enabled
+            if npc.path is not None and len(npc.path) > 1:
+                points = [
+                    grid.grid_to_screen(node.x, node.y)
+                    for node in npc.path
+                ]
+                pygame.draw.lines(surface, npc.color, False, points, width=3)
+        if npc.thought_text:
+            font = pygame.font.Font(None, 24)
+            text_surface = font.render(npc.thought_text, True, npc.color)
+            text_rect = text_surface.get_rect(center=(grid.grid_to_screen(npc.position.x, npc.position.y - 1)))
+            text_surface.set_alpha(max(0, 255 * (1 - npc.thought_timer / npc.THOUGHT_DURATION)))
+            surface.blit(text_surface, text_rect)
+
+# The hider's scores for each tile (see Hider.debug_layer()).
+def draw_hider_debug(surface: pygame.Surface, hider: Hider):
+    font = pygame.font.Font(None, 15)
+    text_color = (0, 0, 0)
+    if not hider.debug_text or not len(hider.debug_text) == len(hider.debug_nodes):
+        hider.debug_text = [""] * len(hider.debug_nodes)
+    for node, text in zip(hider.debug_nodes, hider.debug_text):
+        nodepos = node.get_position()
+        screenpos = hider.grid.grid_to_screen(nodepos[0] + 0.5, nodepos[1] + 0.5)
+        rectsize = 16
+        rect = pygame.Rect(
+            screenpos[0] - rectsize // 2,
+            screenpos[1] - rectsize // 2,
+            rectsize,
+            rectsize
+        )
+        pygame.draw.rect(surface, (255, 255, 255), rect)
+        text_surface = font.render(text, True, text_color)
+        text_rect = text_surface.get_rect(center=rect.center)
+        surface.blit(text_surface, text_rect)